@@ -0,0 +1,20 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.database import db_manager
+
+def migrate():
+    print("Starting migration...")
+    try:
+        # 1 when the category was set by a user (PATCH /documents/{id}): never overwritten by /reclassify
+        db_manager.execute_query(
+            "ALTER TABLE Documents ADD COLUMN categorie_corrigee TINYINT(1) NOT NULL DEFAULT 0 AFTER categorie"
+        )
+        print("Column 'categorie_corrigee' added successfully.")
+
+        print("Migration completed successfully.")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -1,8 +1,45 @@
+import os
+import signal
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import auth, documents
+from .services.ocr_executor import ocr_executor
+from .services.classifier import classifier_service
 
-app = FastAPI(title="IntelliDoc API")
+async def reload_model():
+    """Charge la version active du registre hors de la boucle d'événements, puis l'échange."""
+    try:
+        await asyncio.to_thread(classifier_service.check_for_update)
+    except Exception as e:
+        logging.error(f"Rechargement du modèle impossible : {e}")
+
+async def watch_model_registry(interval):
+    """Surveillance du registre : chaque worker du serveur prend la nouvelle version sans redémarrer."""
+    while True:
+        await asyncio.sleep(interval)
+        await reload_model()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop = asyncio.get_running_loop()
+    # kill -HUP <pid> : rechargement du modèle actif du registre
+    if hasattr(signal, "SIGHUP"):
+        try:
+            loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(reload_model()))
+        except (NotImplementedError, RuntimeError):
+            pass
+    interval = float(os.getenv("MODEL_RELOAD_INTERVAL", "0"))
+    watcher = asyncio.create_task(watch_model_registry(interval)) if interval > 0 else None
+    yield
+    if watcher:
+        watcher.cancel()
+    # Arrêt propre des workers OCR
+    ocr_executor.shutdown()
+
+app = FastAPI(title="IntelliDoc API", lifespan=lifespan)
 
 # CORS setup for Streamlit
 app.add_middleware(
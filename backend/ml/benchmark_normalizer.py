@@ -0,0 +1,63 @@
+import os
+import re
+import sys
+import time
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.services.text_normalizer import normalize_text, normalize_texts
+
+# Configuration
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATH = os.path.join(BASE_DIR, "dataset.csv")
+REPEAT = 20
+
+
+def legacy_clean_text(text):
+    """Ancienne version de MLDocumentClassifier.clean_text (référence)."""
+    if not text: return ""
+    text = str(text).replace('\\n', ' ').replace('\n', ' ')
+    text = text.lower()
+    text = re.sub(r'[^a-zA-Z0-9\sàâäéèêëîïôöùûüç]', ' ', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def timed(fn, texts):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = fn(texts)
+    return (time.perf_counter() - start) / REPEAT, result
+
+
+def run_benchmark():
+    print(f"--- Chargement du dataset : {CSV_PATH} ---")
+    if not os.path.exists(CSV_PATH):
+        print(f"Erreur : Le fichier {CSV_PATH} n'existe pas.")
+        return
+
+    texts = pd.read_csv(CSV_PATH)['texte'].astype(str)
+    # Corpus agrandi pour des mesures stables
+    texts = pd.concat([texts] * 10, ignore_index=True)
+    print(f"Nombre de textes : {len(texts)} ({texts.str.len().sum()} caractères)")
+
+    candidates = {
+        "clean_text (ancien)": lambda values: [legacy_clean_text(t) for t in values],
+        "normalize_text": lambda values: [normalize_text(t) for t in values],
+        "normalize_texts (lot)": normalize_texts,
+    }
+
+    reference = None
+    print(f"\n--- Temps moyen sur {REPEAT} passages ---")
+    for name, fn in candidates.items():
+        seconds, result = timed(fn, texts)
+        result = list(result)
+        if reference is None:
+            reference = result
+        # Sortie identique hors ligatures (œ, æ, ÿ désormais conservées)
+        same = all(a == b for a, b, t in zip(reference, result, texts) if not set("œæÿ") & set(t.lower()))
+        print(f"{name: <22} | {seconds * 1000:8.2f} ms | identique : {'oui' if same else 'NON'}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -26,7 +26,8 @@ def main():
     
     if success:
         print("\n✅ Entraînement terminé avec succès !")
-        print("Le nouveau modèle est sauvegardé dans backend/models/classifier.joblib")
+        print(f"Nouvelle version {classifier_service.model_version} publiée dans {classifier_service.registry.directory}")
+        print("Serveur en cours : SIGHUP, POST /documents/model/reload ou MODEL_RELOAD_INTERVAL pour la charger")
     else:
         print("\n❌ Échec de l'entraînement.")
 
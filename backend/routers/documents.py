@@ -1,33 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from typing import Optional
+import asyncio
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form
+from typing import List, Optional
 from ..database import db_manager
-from ..services.ocr import ocr_service
+from ..services.ocr_executor import ocr_executor
+from ..services.metrics import ocr_metrics
+from ..services.cascade import ocr_cascade, cascade_metrics
 from ..services.classifier import classifier_service
+from ..services.online_learning import online_learner, online_metrics
 from .auth import get_current_user
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
 
+async def store_full_text(doc_id, contents, filename):
+    """Tâche de fond : remplace le texte partiel (arrêt anticipé) par le texte complet."""
+    import logging
+    result = await ocr_cascade.complete_text(contents, filename=filename)
+    if not result.ok or not result.text:
+        logging.warning(f"Texte complet indisponible pour {filename} (doc {doc_id}) : {result.error}")
+        return
+    db_manager.execute_query(
+        "UPDATE Documents SET texte_extrait = %s WHERE id_document = %s",
+        (result.text, doc_id)
+    )
+    logging.info(f"Texte complet stocké pour {filename} (doc {doc_id}, {len(result.text)} caractères)")
+
+_correction_flag = False
+
+def correction_flag_available():
+    """Vrai si la colonne Documents.categorie_corrigee existe (migrate_category_source.py).
+    Seul un résultat positif est mémorisé : la migration est prise en compte sans redémarrage."""
+    global _correction_flag
+    if not _correction_flag:
+        rows = db_manager.execute_query(
+            "SELECT COUNT(*) AS n FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'Documents' AND COLUMN_NAME = 'categorie_corrigee'"
+        )
+        _correction_flag = bool(rows and rows[0]['n'])
+    return _correction_flag
+
+def learn_from_correction(doc_id, category):
+    """Tâche de fond : transmet la catégorie corrigée et le texte du document à l'apprentissage incrémental."""
+    docs = db_manager.execute_query("SELECT texte_extrait FROM Documents WHERE id_document = %s", (doc_id,))
+    if docs and docs[0]['texte_extrait']:
+        online_learner.submit(docs[0]['texte_extrait'], category)
+
 @router.post("/upload")
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     avis_utilisateur: Optional[str] = Form(None),
+    full_text: bool = Form(False),
     current_user: dict = Depends(get_current_user)
 ):
     contents = await file.read()
     import logging
     
-    # Process OCR and Classification
-    text, error = ocr_service.extract_from_bytes(contents, filename=file.filename)
-    if error:
-        logging.error(f"OCR FAILED for {file.filename}: {error}")
-        raise HTTPException(status_code=500, detail=f"OCR Error: {error}")
+    # Process OCR (pool de workers, cascade rapide -> complet) and Classification
+    result, category, confidence, ocr_level = await ocr_cascade.extract_and_classify(
+        contents, filename=file.filename, full_text=full_text
+    )
+    if not result.ok:
+        logging.error(f"OCR FAILED for {file.filename}: [{result.error_code}] {result.error}")
+        raise HTTPException(status_code=500, detail=f"OCR Error: {result.error}")
+    text = result.text
     
     logging.info(f"--- DEBUG UPLOAD {file.filename} --")
-    logging.info(f"Extracted Text Length: {len(text) if text else 0}")
+    logging.info(f"Extracted Text Length: {len(text) if text else 0} (OCR {ocr_level})")
     logging.info(f"Extracted Text Preview: {text[:500] if text else 'EMPTY TEXT'}")
     
-    category, confidence = classifier_service.classify(text)
-    
     logging.info(f"Classification Result: {category} (Conf: {confidence})")
     logging.info("----------------------------------")
     
@@ -41,6 +81,10 @@ async def upload_document(
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
     """, (current_user['id_user'], file.filename, file_size, content_type, f"uploads/{file.filename}", text, category, confidence, avis_utilisateur))
     
+    # Classement fait sur le début du document : le texte complet est extrait après la réponse
+    if result.early_stop and doc_id:
+        background_tasks.add_task(store_full_text, doc_id, contents, file.filename)
+    
     return {
         "id": doc_id,
         "filename": file.filename,
@@ -48,9 +92,105 @@ async def upload_document(
         "content_type": content_type,
         "text": text,
         "category": category,
-        "confidence": confidence
+        "confidence": confidence,
+        "ocr_level": ocr_level,
+        "ocr": result.summary()
     }
 
+@router.post("/upload/batch")
+async def upload_documents(
+    files: List[UploadFile] = File(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """Import en masse : OCR complet en parallèle sur le pool, puis une seule classification pour le lot."""
+    import logging
+    contents = [await file.read() for file in files]
+    results = await asyncio.gather(*(
+        ocr_executor.extract_async(data, filename=file.filename) for file, data in zip(files, contents)
+    ))
+
+    ok = [i for i, result in enumerate(results) if result.ok]
+    classified = await asyncio.to_thread(classifier_service.classify_many, [results[i].text for i in ok])
+    predictions = dict(zip(ok, classified))
+
+    documents = []
+    for i, (file, data, result) in enumerate(zip(files, contents, results)):
+        if not result.ok:
+            logging.error(f"OCR FAILED for {file.filename}: [{result.error_code}] {result.error}")
+            documents.append({"filename": file.filename, "error": result.error, "ocr": result.summary()})
+            continue
+        category, confidence = predictions[i]
+        content_type = file.content_type or "application/octet-stream"
+        doc_id = db_manager.execute_query("""
+            INSERT INTO Documents (id_user, nom_fichier, taille, type_mime, chemin_fichier, texte_extrait, categorie, score_confiance)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (current_user['id_user'], file.filename, len(data), content_type, f"uploads/{file.filename}", result.text, category, confidence))
+        documents.append({
+            "id": doc_id,
+            "filename": file.filename,
+            "size": len(data),
+            "content_type": content_type,
+            "category": category,
+            "confidence": confidence,
+            "ocr": result.summary()
+        })
+
+    logging.info(f"Import en masse : {len(ok)}/{len(files)} documents classés")
+    return {"documents": documents}
+
+@router.post("/reclassify")
+async def reclassify_documents(
+    data: Optional[dict] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Reclasse les documents stockés (tous, ou `ids`) avec le modèle courant, par lots.
+    Les catégories corrigées par un utilisateur (categorie_corrigee) ne sont jamais remplacées."""
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    import logging
+    # Sans la colonne, les corrections des utilisateurs ne sont pas protégées : on refuse
+    if not correction_flag_available():
+        raise HTTPException(status_code=409, detail="Colonne categorie_corrigee absente : "
+                            "lancer backend/database/migrate_category_source.py avant de reclasser")
+    ids = (data or {}).get("ids")
+    if ids:
+        placeholders = ", ".join(["%s"] * len(ids))
+        docs = db_manager.execute_query(
+            f"SELECT id_document, texte_extrait, categorie, categorie_corrigee FROM Documents "
+            f"WHERE id_document IN ({placeholders})",
+            tuple(ids)
+        )
+    else:
+        docs = db_manager.execute_query(
+            "SELECT id_document, texte_extrait, categorie, categorie_corrigee FROM Documents"
+        )
+    if docs is None:
+        raise HTTPException(status_code=500, detail="Lecture des documents impossible")
+    corrected = sum(1 for doc in docs if doc['categorie_corrigee'])
+    docs = [doc for doc in docs if not doc['categorie_corrigee']]
+
+    batch_size = 256
+    changed = 0
+    for start in range(0, len(docs), batch_size):
+        batch = docs[start:start + batch_size]
+        classified = await asyncio.to_thread(
+            classifier_service.classify_many, [doc['texte_extrait'] or "" for doc in batch]
+        )
+        for doc, (category, confidence) in zip(batch, classified):
+            # La condition protège aussi une correction faite pendant le reclassement
+            res = db_manager.execute_query(
+                "UPDATE Documents SET categorie = %s, score_confiance = %s "
+                "WHERE id_document = %s AND categorie_corrigee = 0",
+                (category, confidence, doc['id_document'])
+            )
+            if res is None:
+                raise HTTPException(status_code=500, detail=f"Mise à jour du document {doc['id_document']} impossible")
+            changed += res > 0 and category != doc['categorie']
+
+    logging.info(f"Reclassement : {len(docs)} documents, {changed} changements de catégorie, "
+                 f"{corrected} corrections utilisateur conservées")
+    return {"reclassified": len(docs), "changed": changed, "skipped_corrected": corrected}
+
 @router.get("/")
 async def list_documents(current_user: dict = Depends(get_current_user)):
     if current_user.get('role') == 'admin':
@@ -76,10 +216,56 @@ async def get_stats(current_user: dict = Depends(get_current_user)):
         """, (current_user['id_user'],))
     return stats
 
+@router.get("/ocr/metrics")
+async def get_ocr_metrics(current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    return {
+        "ocr": ocr_metrics.snapshot(),
+        "cache": ocr_executor.cache.stats() if ocr_executor.cache else None,
+        "cascade": cascade_metrics.snapshot(),
+        "online_learning": online_metrics.snapshot()
+    }
+
+@router.get("/model")
+async def get_model_versions(current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    return {
+        "active": classifier_service.model_version,
+        "registry_current": classifier_service.registry.current(),
+        "versions": classifier_service.registry.versions()
+    }
+
+@router.post("/model/reload")
+async def reload_model(
+    data: Optional[dict] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Charge une version (par défaut la version active du registre) puis l'échange sans interrompre les requêtes."""
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    try:
+        version = await asyncio.to_thread(classifier_service.reload, (data or {}).get("version"))
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"active": version}
+
+@router.post("/model/rollback")
+async def rollback_model(current_user: dict = Depends(get_current_user)):
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    try:
+        version = await asyncio.to_thread(classifier_service.rollback)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"active": version}
+
 @router.patch("/{doc_id}")
 async def update_document(
     doc_id: int, 
     data: dict, 
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
     category = data.get("categorie")
@@ -89,8 +275,14 @@ async def update_document(
     params = []
     
     if category:
+        # Catégorie choisie par l'utilisateur : /reclassify ne la remplacera plus
         update_fields.append("categorie = %s")
         params.append(category)
+        if correction_flag_available():
+            update_fields.append("categorie_corrigee = 1")
+        else:
+            import logging
+            logging.warning("Colonne categorie_corrigee absente : correction non protégée de /reclassify")
     if avis is not None:
         update_fields.append("avis_utilisateur = %s")
         params.append(avis)
@@ -102,9 +294,15 @@ async def update_document(
     query = f"UPDATE Documents SET {', '.join(update_fields)} WHERE id_document = %s AND id_user = %s"
     
     res = db_manager.execute_query(query, tuple(params))
+    if res is None:
+        raise HTTPException(status_code=500, detail="Mise à jour du document impossible")
     if res == 0:
         raise HTTPException(status_code=404, detail="Document not found or no change made")
     
+    # Correction de catégorie : apprise en arrière-plan (micro-lots, hors requête)
+    if category and online_learner.enabled:
+        background_tasks.add_task(learn_from_correction, doc_id, category)
+    
     return {"message": "Document updated successfully"}
 
 @router.delete("/{doc_id}")
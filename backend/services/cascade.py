@@ -0,0 +1,68 @@
+import os
+import time
+import logging
+from .metrics import Metrics
+from .ocr_executor import ocr_executor
+from .classifier import classifier_service
+
+cascade_metrics = Metrics()
+
+
+class OCRCascade:
+    """OCR grossier puis fin, piloté par la confiance du classifieur.
+
+    1. Passe rapide (1re page, basse résolution, une seule passe Tesseract) puis classification.
+    2. Escalade vers l'OCR complet (toutes pages, pleine qualité) seulement si la confiance
+       est sous `min_confidence`, si la passe rapide échoue, ou si l'appelant demande le texte complet.
+
+    La passe rapide s'arrête dès qu'il y a assez de texte pour classer (OCRResult.early_stop) :
+    l'appelant complète alors le texte stocké en arrière-plan via `complete_text`.
+    - OCR_CASCADE : 1 pour activer (désactivée par défaut : OCR complet systématique).
+    - OCR_CASCADE_MIN_CONFIDENCE : confiance minimale pour accepter la passe rapide.
+    """
+
+    def __init__(self, executor=ocr_executor, classifier=classifier_service):
+        self.executor = executor
+        self.classifier = classifier
+        self.enabled = os.getenv("OCR_CASCADE", "0") == "1"
+        self.min_confidence = float(os.getenv("OCR_CASCADE_MIN_CONFIDENCE", "0.80"))
+
+    async def _full(self, contents, filename):
+        start = time.perf_counter()
+        result = await self.executor.extract_async(contents, filename=filename)
+        cascade_metrics.observe("cascade.full", time.perf_counter() - start)
+        if not result.ok:
+            return result, None, None
+        category, confidence = self.classifier.classify(result.text)
+        return result, category, confidence
+
+    async def complete_text(self, contents, filename=""):
+        """Extraction complète d'un document déjà classé sur un texte partiel (hors requête)."""
+        start = time.perf_counter()
+        result = await self.executor.extract_async(contents, filename=filename)
+        cascade_metrics.observe("cascade.completion", time.perf_counter() - start)
+        return result
+
+    async def extract_and_classify(self, contents, filename="", full_text=False):
+        """Retourne (OCRResult, category, confidence, level) avec level 'fast' ou 'full'."""
+        if not self.enabled or full_text:
+            cascade_metrics.incr("cascade.full_requested" if full_text else "cascade.disabled")
+            return (*await self._full(contents, filename), "full")
+
+        start = time.perf_counter()
+        result = await self.executor.extract_async(contents, filename=filename, profile="fast")
+        cascade_metrics.observe("cascade.fast", time.perf_counter() - start)
+        if result.ok and result.text:
+            category, confidence = self.classifier.classify(result.text)
+            if confidence >= self.min_confidence:
+                cascade_metrics.incr("cascade.fast_accepted")
+                logging.info(f"Cascade : passe rapide suffisante pour {filename} ({category}, {confidence:.2f})")
+                return result, category, confidence, "fast"
+            logging.info(f"Cascade : confiance {confidence:.2f} < {self.min_confidence}, escalade OCR complet")
+        else:
+            logging.info(f"Cascade : passe rapide vide pour {filename}, escalade OCR complet")
+
+        cascade_metrics.incr("cascade.escalated")
+        return (*await self._full(contents, filename), "full")
+
+ocr_cascade = OCRCascade()
@@ -1,36 +1,22 @@
 import os
 import pickle
 import logging
-import re
+import time
+import threading
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.linear_model import SGDClassifier, LogisticRegression
-from sklearn.calibration import CalibratedClassifierCV
-from sklearn.pipeline import Pipeline
-
-
-
-
-from sklearn.model_selection import train_test_split
-from joblib import dump, load
+from joblib import load
+from .keyword_matcher import KeywordMatcher
+from .model_tournament import train_candidates, measure_pipeline
+from .text_normalizer import normalize_text, normalize_texts
+from .model_registry import model_registry, dataset_hash
+from .linear_scorer import export_linear
 
 class MLDocumentClassifier:
     def clean_text(self, text):
-        """Nettoie le texte pour l'extraction de features."""
-        if not text: return ""
-        # 1. Remplacement des \n littéraux et réels par des espaces
-        text = str(text).replace('\\n', ' ').replace('\n', ' ')
-        # 2. Mise en minuscule
-        text = text.lower()
-        # 3. Suppression des caractères spéciaux
-        text = re.sub(r'[^a-zA-Z0-9\sàâäéèêëîïôöùûüç]', ' ', text)
-        # 4. Suppression des espaces doubles
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        """Nettoie le texte pour l'extraction de features (voir text_normalizer)."""
+        return normalize_text(text)
 
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, registry=None):
         if model_path is None:
             # Resolve path relative to this file's location
             base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -39,6 +25,15 @@ class MLDocumentClassifier:
             self.model_path = model_path
             
         self.model = None
+        # Modèles versionnés : la version active est chargée en priorité (classifier.joblib en repli)
+        self.registry = registry or model_registry
+        self.model_version = None
+        self._previous = None  # (version, modèle) remplacés au dernier échange, pour un retour arrière instantané
+        self._reload_lock = threading.Lock()
+        # Features de l'entraînement : 'tfidf' (vocabulaire appris), 'hashing' (hachage + IDF,
+        # sans vocabulaire) ou 'both' (les deux en compétition dans le tournoi)
+        self.train_features = os.getenv("TRAIN_FEATURES", "tfidf")
+        self.hashing_features = int(os.getenv("TRAIN_HASHING_FEATURES", str(2 ** 14)))
         
         # Extended STOP WORDS (French + English)
         self.custom_stop_words = [
@@ -116,10 +111,21 @@ class MLDocumentClassifier:
             ],
             "AUTRE": []
         }
+        self._keyword_matcher = None
+        self._keyword_signature = None
         
         self.load_model()
 
     def load_model(self):
+        version = self.registry.current()
+        if version:
+            try:
+                self.model = self.registry.load(version)
+                self.model_version = version
+                logging.info(f"Modèle ML chargé depuis le registre (version {version})")
+                return
+            except Exception as e:
+                logging.error(f"Erreur lors du chargement de la version {version} du registre : {e}")
         if os.path.exists(self.model_path):
             try:
                 # IMPORTANT: Matching the save method (joblib.dump -> joblib.load)
@@ -148,7 +154,7 @@ class MLDocumentClassifier:
             classes_to_keep = class_counts[class_counts >= 2].index
             df = df[df['categorie'].isin(classes_to_keep)]
             
-            texts = [self.clean_text(str(t)) for t in df['texte'].tolist()]
+            texts = normalize_texts(df['texte'].astype(str).tolist())
             labels = df['categorie'].tolist()
             
             return self._train_from_data(texts, labels)
@@ -158,7 +164,7 @@ class MLDocumentClassifier:
 
     def train_from_folder(self, data_path="uploads/training_data"):
         """Entraîne le modèle à partir des dossiers de données réelles (OCR)."""
-        from .ocr import ocr_service
+        from .ocr_executor import ocr_executor
         import glob
         
         logging.info("Démarrage de l'entraînement par OCR des dossiers...")
@@ -172,133 +178,281 @@ class MLDocumentClassifier:
             
         categories = [d for d in os.listdir(data_path) if os.path.isdir(os.path.join(data_path, d))]
         
+        file_labels = []
         for category in categories:
             if category == "augmented": continue
             
             files = glob.glob(os.path.join(data_path, category, "*.*"))
             logging.info(f"Traitement catégorie '{category}' : {len(files)} fichiers trouvés.")
-            
-            for file_path in files:
+            file_labels.extend((file_path, category) for file_path in files)
+        
+        def iter_jobs():
+            for file_path, _ in file_labels:
                 try:
                     with open(file_path, "rb") as f:
                         content = f.read()
-                    
-                    text, _ = ocr_service.extract_from_bytes(content, filename=os.path.basename(file_path))
-                    
-                    if text and len(text) > 10:
-                        texts.append(text)
-                        labels.append(category)
                 except Exception as e:
                     logging.warning(f"Erreur lecture {file_path}: {e}")
+                    content = b""
+                yield content, os.path.basename(file_path)
+        
+        # OCR en parallèle sur le pool partagé (résultats dans l'ordre des fichiers)
+        results = ocr_executor.map_extract(iter_jobs())
+        for (file_path, category), (text, error) in zip(file_labels, results):
+            if error:
+                logging.warning(f"Erreur OCR {file_path}: {error}")
+            if text and len(text) > 10:
+                texts.append(text)
+                labels.append(category)
                     
         return self._train_from_data(texts, labels)
 
-    def _train_from_data(self, texts, labels):
-        """Logique centrale du championnat de modèles."""
+    def _feature_steps(self, mode):
+        """Étapes de vectorisation d'un mode de features (non ajustées)."""
+        from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
+        
+        if mode == "hashing":
+            # Sans état : pas de vocabulaire à stocker, seul l'IDF est appris
+            return [
+                ('hashing', HashingVectorizer(
+                    n_features=self.hashing_features,
+                    stop_words=self.custom_stop_words,
+                    ngram_range=(1, 2),
+                    alternate_sign=False, # Features positives (requis par NaiveBayes)
+                    norm=None
+                )),
+                ('tfidf', TfidfTransformer())
+            ]
+        return [
+            ('tfidf', TfidfVectorizer(
+                max_features=5000, 
+                stop_words=self.custom_stop_words,
+                ngram_range=(1, 2) # Capture phrases comme "due date"
+            ))
+        ]
+
+    def _train_from_data(self, texts, labels, features=None):
+        """Logique centrale du championnat de modèles.
+        `features` : 'tfidf', 'hashing' ou 'both' (par défaut TRAIN_FEATURES)."""
+        # sklearn n'est importé que pour l'entraînement (l'inférence peut s'en passer)
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.naive_bayes import MultinomialNB
+        from sklearn.linear_model import SGDClassifier, LogisticRegression
+        from sklearn.calibration import CalibratedClassifierCV
+        from sklearn.pipeline import Pipeline
+        from sklearn.model_selection import train_test_split
+        
         if not texts or len(texts) < 5:
             logging.error("Pas assez de données pour l'entraînement.")
             return False
+        
+        features = features or self.train_features
+        modes = ["tfidf", "hashing"] if features == "both" else [features]
+        if any(mode not in ("tfidf", "hashing") for mode in modes):
+            logging.error(f"Mode de features inconnu : {features}")
+            return False
             
         # Division Training / Test
         X_train, X_test, y_train, y_test = train_test_split(texts, labels, test_size=0.2, random_state=42, stratify=labels)
         
-        models = {
-            "LogisticRegression": LogisticRegression(class_weight='balanced', max_iter=1000, random_state=42),
-            "RandomForest": RandomForestClassifier(n_estimators=200, random_state=42),
-            "NaiveBayes": MultinomialNB(),
-            "SVM (Linear)": CalibratedClassifierCV(SGDClassifier(loss='hinge', penalty='l2', alpha=1e-3, random_state=42))
-        }
+        def candidates():
+            # Estimateurs neufs pour chaque mode : un vainqueur déjà retenu n'est jamais réajusté
+            return {
+                "LogisticRegression": LogisticRegression(class_weight='balanced', max_iter=1000, random_state=42),
+                "RandomForest": RandomForestClassifier(n_estimators=200, random_state=42),
+                "NaiveBayes": MultinomialNB(),
+                "SVM (Linear)": CalibratedClassifierCV(SGDClassifier(loss='hinge', penalty='l2', alpha=1e-3, random_state=42))
+            }
         
         best_score = 0
         best_model_name = ""
         best_model_obj = None
+        best_features = None
         
         print("\n--- Début du Tournoi de Modèles (V2 - Clean Data) ---")
         
-        for name, model in models.items():
-            pipeline = Pipeline([
-                ('tfidf', TfidfVectorizer(
-                    max_features=5000, 
-                    stop_words=self.custom_stop_words,
-                    ngram_range=(1, 2) # Capture phrases comme "due date"
-                )),
-                ('clf', model)
-            ])
+        for mode in modes:
+            # Vectorisation ajustée une seule fois par mode : les matrices creuses sont partagées
+            # par tous les candidats
+            start = time.perf_counter()
+            steps = self._feature_steps(mode)
+            vectorizer = Pipeline(steps)
+            X_train_features = vectorizer.fit_transform(X_train)
+            X_test_features = vectorizer.transform(X_test)
+            print(f"\n[ Features : {mode} ] Vectorisation : {time.perf_counter() - start:.2f}s")
             
-            pipeline.fit(X_train, y_train)
-            score = pipeline.score(X_test, y_test)
-            print(f"Modèle : {name: <15} | Précision : {score:.2%}")
-            
-            if score > best_score:
-                best_score = score
-                best_model_name = name
-                best_model_obj = pipeline
+            # Candidats entraînés en parallèle (un processus par candidat)
+            start = time.perf_counter()
+            results = train_candidates(candidates(), X_train_features, y_train, X_test_features, y_test)
+            print(f"Tournoi : {time.perf_counter() - start:.2f}s (temps réel)")
+            for name, model, score, seconds in results:
+                # Le vainqueur reste sauvegardé comme un seul pipeline (étapes déjà ajustées)
+                pipeline = Pipeline(steps + [('clf', model)])
+                size, load_seconds, latency_ms = measure_pipeline(pipeline, X_test)
+                print(f"Modèle : {name: <15} | Précision : {score:.2%} | Entraînement : {seconds:.2f}s"
+                      f" | Taille : {size / 1024:.0f} Ko | Chargement : {load_seconds * 1000:.0f} ms"
+                      f" | Latence : {latency_ms:.2f} ms/doc")
+                
+                if score > best_score:
+                    best_score = score
+                    best_model_name = name
+                    best_model_obj = pipeline
+                    best_features = mode
         
         print("-" * 40)
-        print(f"🏆 VAINQUEUR : {best_model_name} avec {best_score:.2%} de précision")
+        print(f"🏆 VAINQUEUR : {best_model_name} ({best_features}) avec {best_score:.2%} de précision")
         print("-" * 40)
         
         self.model = best_model_obj
         
-        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+        # Évaluation du système complet (règles puis ML) en un seul appel au modèle
+        predictions = [category for category, _ in self.classify_many(X_test)]
+        system_score = sum(p == y for p, y in zip(predictions, y_test)) / len(y_test)
+        print(f"Système complet (règles + ML) | Précision : {system_score:.2%}")
+        
+        # Nouvelle version dans le registre : les serveurs en cours la chargent sans redémarrer.
+        # Le split de test est gardé avec la version : exemples que ce modèle n'a jamais vus,
+        # seule base de comparaison honnête pour l'apprentissage incrémental
         try:
-            dump(self.model, self.model_path)
-            logging.info(f"Modèle vainqueur ({best_model_name}) sauvegardé dans {self.model_path}")
+            self.model_version = self.registry.publish(self.model, {
+                "model": best_model_name,
+                "features": best_features,
+                "score": round(best_score, 4),
+                "system_score": round(system_score, 4),
+                "dataset_hash": dataset_hash(texts, labels),
+                "n_samples": len(texts),
+                "classes": sorted(set(labels)),
+            }, export=export_linear, extras={"holdout": list(zip(normalize_texts(X_test), y_test))})
+            logging.info(f"Modèle vainqueur ({best_model_name}) publié : version {self.model_version}")
             return True
         except Exception as e:
             logging.error(f"Erreur sauvegarde : {e}")
             return False
 
-    def classify(self, text):
-        text_clean = self.clean_text(text)
-        text_lower = text_clean
-        
-        # 1. PRIORITÉ : Mots-clés (Approche MVP simple et efficace)
-        scores = {cat: 0 for cat in self.fallback_categories}
-        for cat, keywords in self.fallback_categories.items():
-            for kw in keywords:
-                count = text_lower.count(kw.lower())
-                if count > 0:
-                    # Bonus pour les mots-clés longs (> 4 chars)
-                    scores[cat] += count * (2 if len(kw) > 4 else 1)
-        
+    def _swap(self, model, version):
+        """Échange atomique : les classifications en cours gardent l'ancien modèle jusqu'à leur fin."""
+        self._previous = (self.model_version, self.model)
+        self.model, self.model_version = model, version
+        logging.info(f"Modèle ML actif : version {version} (précédente : {self._previous[0]})")
+
+    def reload(self, version=None):
+        """Charge `version` (par défaut la version active du registre) puis l'échange avec le
+        modèle en service. Le chargement complet se fait avant l'échange : aucune requête ne
+        voit un modèle à moitié chargé. Retourne la version en service."""
+        with self._reload_lock:
+            version = version or self.registry.current()
+            if version is None:
+                raise ValueError("Registre de modèles vide")
+            if version == self.model_version:
+                return version
+            model = self.registry.load(version)
+            if version != self.registry.current():
+                self.registry.activate(version)
+            self._swap(model, version)
+            return version
+
+    def rollback(self):
+        """Revient à la version précédente du registre (instantané si elle est encore en mémoire)."""
+        with self._reload_lock:
+            version = self.registry.previous()
+            if version is None:
+                raise ValueError("Aucune version précédente")
+            if self._previous and self._previous[0] == version:
+                model = self._previous[1]
+            else:
+                model = self.registry.load(version)
+            self.registry.rollback()
+            self._swap(model, version)
+            return version
+
+    def check_for_update(self):
+        """Recharge si la version active du registre a changé (autre processus, réentraînement)."""
+        version = self.registry.current()
+        if version and version != self.model_version:
+            return self.reload(version)
+        return None
+
+    def keyword_matcher(self):
+        """Table de mots-clés compilée ; recompilée seulement si `fallback_categories` a changé."""
+        signature = tuple((cat, tuple(keywords)) for cat, keywords in self.fallback_categories.items())
+        if signature != self._keyword_signature:
+            self._keyword_matcher = KeywordMatcher(self.fallback_categories)
+            self._keyword_signature = signature
+        return self._keyword_matcher
+
+    def _rule_scores(self, text_clean):
+        """Scores par mots-clés : (scores, meilleure catégorie, total des occurrences pondérées)."""
+        # Un seul parcours du texte pour tous les mots-clés (bonus x2 pour les mots-clés > 4 chars)
+        scores = self.keyword_matcher().scores(text_clean)
         best_cat_rules = max(scores, key=scores.get)
-        total_hits = sum(scores.values())
-        
-        # Si on a des correspondances claires par mots-clés
-        if total_hits >= 2:
-            confidence_rules = min(scores[best_cat_rules] / total_hits, 0.95)
-            if confidence_rules >= 0.5:
-                logging.info(f"Règles Classifieur - OK : {best_cat_rules} ({confidence_rules:.2f})")
-                return best_cat_rules, confidence_rules
+        return scores, best_cat_rules, sum(scores.values())
 
-        # 2. SECONDAIRE : Modèle ML (si les règles sont incertaines)
-        if self.model:
-            try:
-                prediction = self.model.predict([text_clean])[0]
-                try:
-                    probs = self.model.predict_proba([text_clean])[0]
-                    confidence = float(max(probs))
-                except:
-                    confidence = 0.85
-                
-                logging.info(f"ML Classifieur - Prédiction : {prediction} ({confidence:.2f})")
-                
-                # Si le ML est très sûr de lui, on le suit
-                if confidence > 0.80:
-                    return prediction, confidence
-                
-                # Arbitrage : si ML et Règles sont d'accord
-                if prediction == best_cat_rules and total_hits > 0:
-                    return prediction, max(confidence, 0.70)
-                    
-            except Exception as e:
-                logging.warning(f"Erreur prédiction ML : {e}")
+    def _predict_many(self, model, texts_clean):
+        """(catégorie, confiance) ML par texte : une seule transformation TF-IDF et un seul
+        predict_proba pour tout le lot, catégorie = argmax des probabilités."""
+        try:
+            probs = model.predict_proba(texts_clean)
+        except Exception:
+            return [(prediction, 0.85) for prediction in model.predict(texts_clean)]
+        best = np.argmax(probs, axis=1)
+        return [(model.classes_[j], float(probs[i, j])) for i, j in enumerate(best)]
+
+    def _arbitrate(self, scores, best_cat_rules, total_hits, prediction=None):
+        """Décision finale quand les règles seules ne suffisent pas (prediction : (catégorie, confiance) ML ou None)."""
+        if prediction is not None:
+            prediction, confidence = prediction
+            logging.info(f"ML Classifieur - Prédiction : {prediction} ({confidence:.2f})")
+
+            # Si le ML est très sûr de lui, on le suit
+            if confidence > 0.80:
+                return prediction, confidence
+
+            # Arbitrage : si ML et Règles sont d'accord
+            if prediction == best_cat_rules and total_hits > 0:
+                return prediction, max(confidence, 0.70)
 
         # 3. FALLBACK FINAL
         if total_hits > 0:
             return best_cat_rules, min(scores[best_cat_rules] / total_hits, 0.80)
-            
+
         return "AUTRE", 0.10
 
+    def classify_many(self, texts):
+        """Classe un lot de textes, retourne [(catégorie, confiance)] dans le même ordre.
+
+        Mêmes décisions que `classify` texte par texte, mais le modèle ML n'est appelé qu'une
+        fois pour tout le lot, et seulement sur les textes que les mots-clés ne tranchent pas.
+        """
+        texts_clean = normalize_texts(texts)
+        rules = [self._rule_scores(text) for text in texts_clean]
+        results = [None] * len(texts_clean)
+
+        # 1. PRIORITÉ : Mots-clés (Approche MVP simple et efficace)
+        pending = []
+        for i, (scores, best_cat_rules, total_hits) in enumerate(rules):
+            # Si on a des correspondances claires par mots-clés
+            if total_hits >= 2:
+                confidence_rules = min(scores[best_cat_rules] / total_hits, 0.95)
+                if confidence_rules >= 0.5:
+                    logging.info(f"Règles Classifieur - OK : {best_cat_rules} ({confidence_rules:.2f})")
+                    results[i] = (best_cat_rules, confidence_rules)
+                    continue
+            pending.append(i)
+
+        # 2. SECONDAIRE : Modèle ML (si les règles sont incertaines)
+        predictions = {}
+        model = self.model  # même modèle pour tout le lot, même si un rechargement l'échange entre-temps
+        if model and pending:
+            try:
+                predictions = dict(zip(pending, self._predict_many(model, [texts_clean[i] for i in pending])))
+            except Exception as e:
+                logging.warning(f"Erreur prédiction ML : {e}")
+
+        for i in pending:
+            results[i] = self._arbitrate(*rules[i], predictions.get(i))
+        return results
+
+    def classify(self, text):
+        return self.classify_many([text])[0]
+
 classifier_service = MLDocumentClassifier()
@@ -0,0 +1,136 @@
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import random
+import logging
+import threading
+from .metrics import ocr_metrics
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def safe_name(filename, max_length=60):
+    """Nom de fichier client réduit à un composant sûr (pas de chemin, pas de caractères spéciaux)."""
+    name = _UNSAFE_CHARS.sub("_", os.path.basename(filename or "")).strip("._")
+    return name[:max_length] or "unknown"
+
+
+class DebugArtifactWriter:
+    """Sauvegarde des échecs OCR pour analyse, hors du chemin de la requête.
+
+    - Échantillonnage : seule une fraction `sample_rate` des échecs est conservée.
+    - File bornée vidée par un thread d'écriture : si elle est pleine, l'échec est ignoré
+      (une rafale d'échecs ne devient jamais une rafale d'écritures disque).
+    - Image réduite (`max_side`) et compressée, nom unique et assaini, plus un fichier JSON
+      avec les temps et les décisions de prétraitement.
+    - Rotation : les artefacts les plus anciens sont supprimés au-delà de `max_bytes` au total.
+    """
+
+    def __init__(self, directory=None, sample_rate=None, max_bytes=None, max_side=None,
+                 image_format=None, queue_size=None):
+        self.directory = directory or os.getenv("OCR_DEBUG_DIR", "uploads/debug_ocr")
+        self.sample_rate = float(os.getenv("OCR_DEBUG_SAMPLE_RATE", "0.2") if sample_rate is None else sample_rate)
+        self.max_bytes = int(float(os.getenv("OCR_DEBUG_MAX_MB", "50")) * 1024 * 1024) if max_bytes is None else max_bytes
+        self.max_side = int(os.getenv("OCR_DEBUG_MAX_SIDE", "1600") if max_side is None else max_side)
+        self.image_format = (image_format or os.getenv("OCR_DEBUG_FORMAT", "jpeg")).lower()
+        self._queue = queue.Queue(maxsize=int(os.getenv("OCR_DEBUG_QUEUE", "16") if queue_size is None else queue_size))
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def submit(self, image, filename="", info=None):
+        """Enregistre un échec (non bloquant). Retourne True si l'artefact sera écrit."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            ocr_metrics.incr("ocr.debug.sampled_out")
+            return False
+        try:
+            self._queue.put_nowait((image, filename, dict(info or {}), time.time()))
+        except queue.Full:
+            ocr_metrics.incr("ocr.debug.dropped")
+            return False
+        self._ensure_thread()
+        return True
+
+    def flush(self):
+        """Attend que la file soit vide (tests, arrêt)."""
+        self._queue.join()
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ocr-debug-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                self._write(*item)
+            except Exception as e:
+                logging.warning(f"Artefact de debug OCR non écrit : {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, image, filename, info, created):
+        from PIL import Image
+
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(created))
+        base = os.path.join(self.directory, f"{stamp}_{uuid.uuid4().hex[:8]}_{safe_name(filename)}")
+
+        start = time.perf_counter()
+        original_size = image.size
+        if max(image.size) > self.max_side:
+            image = image.copy()
+            image.thumbnail((self.max_side, self.max_side), Image.Resampling.LANCZOS)
+        if self.image_format == "png":
+            path = f"{base}.png"
+            image.save(path, "PNG", optimize=True)
+        else:
+            path = f"{base}.jpg"
+            image.convert("L" if image.mode in ("L", "1", "LA") else "RGB").save(path, "JPEG", quality=80, optimize=True)
+
+        info.update({
+            "filename": filename,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(created)),
+            "image": os.path.basename(path),
+            "original_size": list(original_size),
+            "saved_size": list(image.size),
+            "write_s": round(time.perf_counter() - start, 4),
+        })
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2, default=str)
+        ocr_metrics.incr("ocr.debug.written")
+        logging.info(f"Artefact de debug OCR : {path}")
+        self._rotate()
+
+    def _rotate(self):
+        """Supprime les artefacts les plus anciens (image + JSON) au-delà du plafond total.
+        Le dossier est relu à chaque fois : plusieurs workers peuvent y écrire."""
+        groups = {}
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stem = os.path.splitext(entry.name)[0]
+                st = entry.stat()
+                size, mtime = groups.get(stem, (0, st.st_mtime))
+                groups[stem] = (size + st.st_size, min(mtime, st.st_mtime))
+        total = sum(size for size, _ in groups.values())
+        for stem, (size, _) in sorted(groups.items(), key=lambda item: (item[1][1], item[0])):
+            if total <= self.max_bytes:
+                break
+            for ext in (".jpg", ".png", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, stem + ext))
+                except OSError:
+                    pass
+            total -= size
+            ocr_metrics.incr("ocr.debug.rotated")
+
+
+debug_artifacts = DebugArtifactWriter()
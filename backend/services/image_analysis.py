@@ -0,0 +1,371 @@
+import numpy as np
+import cv2
+
+# Côté max de la vignette d'analyse : quelques millisecondes quelle que soit la taille de la page
+ANALYSIS_SIZE = 512
+
+
+def thumbnail_gray(image, max_side=ANALYSIS_SIZE):
+    """Vignette en niveaux de gris (np.uint8) sans décoder/copier l'image pleine résolution en float."""
+    factor = max(1, max(image.size) // max_side)
+    small = image.reduce(factor) if factor > 1 else image
+    return np.asarray(small.convert('L'))
+
+
+def estimate_noise(gray):
+    """Écart-type du bruit : réponse laplacienne (noyau d'Immerkær) estimée par la médiane,
+    pour que les contours du texte ne soient pas comptés comme du bruit."""
+    h, w = gray.shape
+    if h < 3 or w < 3:
+        return 0.0
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    response = cv2.filter2D(gray.astype(np.float32), -1, kernel)[1:-1, 1:-1]
+    # Bruit gaussien sigma -> réponse d'écart-type 6*sigma ; MAD -> sigma
+    return float(np.median(np.abs(response)) / (0.6745 * 6.0))
+
+
+def center_crop(array, size=ANALYSIS_SIZE):
+    """Crop central d'un tableau numpy (vue, sans copie)."""
+    h, w = array.shape[:2]
+    top, left = max(0, (h - size) // 2), max(0, (w - size) // 2)
+    return array[top:top + size, left:left + size]
+
+
+def noise_crop(image, size=ANALYSIS_SIZE):
+    """Crop central pleine résolution : le sous-échantillonnage lisserait le bruit à mesurer."""
+    w, h = image.size
+    left, top = max(0, (w - size) // 2), max(0, (h - size) // 2)
+    return np.asarray(image.crop((left, top, min(w, left + size), min(h, top + size))).convert('L'))
+
+
+def _otsu_classes(gray):
+    """(seuil, pixels sombres, pixels clairs) du seuillage d'Otsu."""
+    threshold, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return threshold, gray[gray <= threshold], gray[gray > threshold]
+
+
+def analyze_image(image):
+    """Statistiques bon marché pour choisir le prétraitement avant l'OCR.
+
+    Vignette (mise en page) :
+    - bimodality : variance inter-classes d'Otsu / variance totale (1 = parfaitement bimodal)
+    - ink_density : proportion de pixels "encre" après seuillage d'Otsu
+    Crop central pleine résolution (traits fins, que la vignette lisserait) :
+    - contrast : écart entre le niveau moyen de l'encre et celui du fond, 0..1
+    - noise : écart-type estimé du bruit
+    """
+    gray = thumbnail_gray(image)
+    _, dark, light = _otsu_classes(gray)
+    variance = float(gray.var())
+    if variance > 0 and dark.size and light.size:
+        w0, w1 = dark.size / gray.size, light.size / gray.size
+        bimodality = w0 * w1 * (float(light.mean()) - float(dark.mean())) ** 2 / variance
+    else:
+        bimodality = 0.0
+    ink_density = dark.size / gray.size if variance > 0 else 0.0
+
+    crop = noise_crop(image)
+    _, crop_dark, crop_light = _otsu_classes(crop)
+    if crop_dark.size < 0.005 * crop.size:
+        # Crop central vide (marge, blanc) : repli sur la vignette
+        crop_dark, crop_light = dark, light
+    contrast = (float(crop_light.mean()) - float(crop_dark.mean())) / 255.0 if crop_dark.size and crop_light.size else 0.0
+
+    return {
+        "contrast": round(contrast, 4),
+        "bimodality": round(bimodality, 4),
+        "noise": round(estimate_noise(crop), 4),
+        "ink_density": round(ink_density, 4),
+    }
+
+
+def choose_preprocessing(stats):
+    """Choisit 'soft' (niveaux de gris) ou 'hard' (seuillage adaptatif) à partir des statistiques.
+
+    Le mode 'hard' vise les scans pâles (faible contraste), les fonds inégaux (histogramme
+    non bimodal) et les pages où Otsu voit une densité d'encre aberrante (ombre, fond gris).
+    """
+    if stats["contrast"] < 0.35:
+        return 'hard'
+    if stats["bimodality"] >= 0.75:
+        return 'soft'
+    if stats["ink_density"] > 0.45 or stats["bimodality"] < 0.5:
+        return 'hard'
+    return 'soft'
+
+
+def estimate_text_height(gray, max_side=1600):
+    """Hauteur médiane des caractères (pixels, à l'échelle de `gray`) via les composantes connexes
+    d'une vignette binarisée. None si la page ne contient pas assez de caractères plausibles."""
+    h, w = gray.shape
+    factor = max(1.0, max(h, w) / max_side)
+    small = cv2.resize(gray, (max(1, round(w / factor)), max(1, round(h / factor))),
+                       interpolation=cv2.INTER_AREA) if factor > 1 else gray
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    if binary.mean() > 127:
+        # Texte clair sur fond sombre : l'encre est la classe minoritaire
+        binary = cv2.bitwise_not(binary)
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    # Caractères plausibles : ni poussière, ni cadres/photos, ni traits horizontaux
+    keep = (heights >= 3) & (heights <= small.shape[0] * 0.1) & (widths <= heights * 4) & (areas >= 6)
+    if keep.sum() < 10:
+        return None
+    return float(np.median(heights[keep])) * factor
+
+
+def resolution_scale(shape, text_height, target_height, max_megapixels):
+    """Facteur de rééchantillonnage pour amener le texte à `target_height` pixels,
+    borné par un plafond en mégapixels."""
+    h, w = shape[:2]
+    if text_height:
+        scale = min(4.0, max(0.25, target_height / text_height))
+    else:
+        # Pas de texte mesurable : on n'agrandit que les très petites images
+        scale = 2.0 if max(h, w) < 1000 else 1.0
+    if abs(scale - 1.0) < 0.15:
+        scale = 1.0
+    if h * w * scale * scale > max_megapixels * 1e6:
+        scale = (max_megapixels * 1e6 / (h * w)) ** 0.5
+    return scale
+
+
+def _binary_thumbnail(gray, max_side):
+    """Vignette binaire (encre = 255) pour les analyses de mise en page."""
+    h, w = gray.shape
+    factor = max(1.0, max(h, w) / max_side)
+    small = cv2.resize(gray, (max(1, round(w / factor)), max(1, round(h / factor))),
+                       interpolation=cv2.INTER_AREA) if factor > 1 else gray
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    if binary.mean() > 127:
+        binary = cv2.bitwise_not(binary)
+    return binary
+
+
+def _rotate(binary, angle):
+    h, w = binary.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(binary, matrix, (w, h), flags=cv2.INTER_NEAREST, borderValue=0)
+
+
+def _profile_sharpness(binary):
+    """Netteté du profil horizontal, normalisée par son énergie : maximale quand les lignes
+    de texte sont parfaitement horizontales (transitions franches ligne/interligne)."""
+    profile = binary.sum(axis=1, dtype=np.float64)
+    energy = float(np.sum(profile ** 2))
+    return float(np.sum(np.diff(profile) ** 2)) / energy if energy > 0 else 0.0
+
+
+def _best_angle(binary, angles):
+    scores = [(_profile_sharpness(_rotate(binary, a)), float(a)) for a in angles]
+    return max(scores)
+
+
+def estimate_skew(binary, max_angle=10.0):
+    """Angle (degrés, sens trigonométrique) qui rend les lignes horizontales :
+    recherche grossière au degré près puis fine au 1/5e de degré sur les profils de projection.
+    Retourne (angle, netteté)."""
+    _, coarse = _best_angle(binary, np.arange(-max_angle, max_angle + 0.5, 1.0))
+    score, fine = _best_angle(binary, np.arange(coarse - 0.8, coarse + 0.9, 0.2))
+    return round(fine, 1), score
+
+
+def _upside_down_ratio(binary):
+    """Rapport encre des ascendantes / encre des descendantes sur les lignes de texte.
+    En écriture latine droite les ascendantes et majuscules dominent (> 1) ; à l'envers, < 1."""
+    profile = binary.sum(axis=1, dtype=np.float64)
+    if not profile.any():
+        return 1.0
+    in_line = profile > 0.1 * profile.max()
+    above = below = 0.0
+    lines = 0
+    start = None
+    for y, inked in enumerate(np.append(in_line, False)):
+        if inked and start is None:
+            start = y
+        elif not inked and start is not None:
+            line = profile[start:y]
+            if len(line) >= 4:
+                core = np.nonzero(line > 0.5 * line.max())[0]
+                above += line[:core[0]].sum()
+                below += line[core[-1] + 1:].sum()
+                lines += 1
+            start = None
+    if lines < 3:
+        # Trop peu de lignes (photo, logo) : pas de décision haut/bas
+        return 1.0
+    return above / below if below > 0 else (2.0 if above > 0 else 1.0)
+
+
+def detect_orientation(gray, max_angle=10.0, max_side=1000):
+    """Orientation (0/90/180/270) et inclinaison résiduelle d'une page, sur une vignette binaire.
+    Retourne (orientation, skew) : tourner de `orientation` puis de `skew` degrés (sens trigonométrique)."""
+    binary = _binary_thumbnail(gray, max_side)
+    if binary.sum() == 0:
+        return 0, 0.0
+
+    # 1. Lignes horizontales ou verticales ? On garde la famille dont le meilleur angle
+    #    donne le profil le plus net (recherche sur une vignette encore réduite de moitié).
+    small = cv2.resize(binary, (binary.shape[1] // 2, binary.shape[0] // 2), interpolation=cv2.INTER_AREA)
+    skew, score = estimate_skew(small, max_angle)
+    skew_90, score_90 = estimate_skew(np.ascontiguousarray(np.rot90(small)), max_angle)
+    orientation = 0
+    # Hystérésis : sans gain net, on considère la page droite (photos, pages quasi vides)
+    if score_90 > 1.2 * score:
+        orientation, skew = 90, skew_90
+        binary = np.ascontiguousarray(np.rot90(binary))
+
+    # 2. Haut ou bas ? (ascendantes vs descendantes, sur la page redressée)
+    if abs(skew) > 0.1:
+        binary = _rotate(binary, skew)
+    if _upside_down_ratio(binary) < 0.8:
+        orientation = (orientation + 180) % 360
+    return orientation, skew
+
+
+def _merge_boxes(boxes, gap):
+    """Fusionne les boîtes (x1, y1, x2, y2) qui se chevauchent horizontalement et sont
+    verticalement proches : lignes -> blocs de texte."""
+    boxes = [list(b) for b in boxes]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                overlap_x = min(a[2], b[2]) - max(a[0], b[0]) > -gap
+                close_y = max(a[1], b[1]) - min(a[3], b[3]) < gap
+                if overlap_x and close_y:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+def reading_order(boxes):
+    """Trie les blocs en ordre de lecture : bandes horizontales de haut en bas, puis de gauche à droite."""
+    rows = []
+    for box in sorted(boxes, key=lambda b: b[1]):
+        for row in rows:
+            # Même bande si le bloc chevauche verticalement le premier bloc de la bande
+            if box[1] < row[0][3] and box[3] > row[0][1]:
+                row.append(box)
+                break
+        else:
+            rows.append([box])
+    return [box for row in rows for box in sorted(row, key=lambda b: b[0])]
+
+
+def find_text_regions(gray, max_side=1200, max_regions=12, max_coverage=0.5):
+    """Blocs de texte (x1, y1, x2, y2) pleine résolution, en ordre de lecture.
+
+    Gradient morphologique sur une vignette, fermeture horizontale pour relier les caractères
+    d'une ligne, puis filtrage des composantes non textuelles (photos, aplats, cadres).
+    Retourne None si la page est dense (découper ne ferait rien gagner) ou trop fragmentée."""
+    h, w = gray.shape
+    factor = max(1.0, max(h, w) / max_side)
+    small = cv2.resize(gray, (max(1, round(w / factor)), max(1, round(h / factor))),
+                       interpolation=cv2.INTER_AREA) if factor > 1 else gray
+
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    line_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, small.shape[1] // 60), 1))
+    lines = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, line_kernel)
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    for contour in contours:
+        x, y, bw, bh = cv2.boundingRect(contour)
+        if bh < 4 or bw < 8:
+            continue
+        # Cadres et traits isolés : très peu de contours à l'intérieur de la boîte
+        if cv2.countNonZero(edges[y:y + bh, x:x + bw]) < 0.1 * bw * bh:
+            continue
+        boxes.append((x, y, x + bw, y + bh))
+    if not boxes:
+        return None
+
+    # Photos, logos, schémas : bien plus hauts qu'une ligne de texte
+    line_height = float(np.median([b[3] - b[1] for b in boxes]))
+    boxes = [b for b in boxes if b[3] - b[1] <= 5 * line_height]
+    if not boxes:
+        return None
+
+    blocks = _merge_boxes(boxes, gap=line_height)
+    if len(blocks) > max_regions:
+        return None
+    coverage = sum((b[2] - b[0]) * (b[3] - b[1]) for b in blocks) / float(small.shape[0] * small.shape[1])
+    if coverage > max_coverage:
+        return None
+
+    # Retour à la pleine résolution, avec une marge d'une demi-ligne autour de chaque bloc
+    pad = line_height / 2
+    return [
+        (max(0, int((b[0] - pad) * factor)), max(0, int((b[1] - pad) * factor)),
+         min(w, int((b[2] + pad) * factor)), min(h, int((b[3] + pad) * factor)))
+        for b in reading_order(blocks)
+    ]
+
+
+def has_ink(image, delta=60, min_fraction=0.0005):
+    """Vrai si l'image (PIL L ou np.uint8) contient des pixels nettement plus sombres que son fond.
+    Pleine résolution : un trait fin disparaîtrait dans une vignette."""
+    gray = np.asarray(image)
+    background = float(np.median(gray[::8, ::8]))
+    return np.count_nonzero(gray < background - delta) >= min_fraction * gray.size
+
+
+def _tile_starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+    step = max(1, tile - overlap)
+    count = -(-(length - overlap) // step)
+    return [min(i * step, length - tile) for i in range(count)]
+
+
+def tile_boxes(size, tile=2400, overlap=200):
+    """Découpe (largeur, hauteur) en tuiles recouvrantes : liste de (boîte, coeur).
+    Les coeurs partitionnent l'image (frontière au milieu de chaque recouvrement) : un mot
+    appartient à la seule tuile dont le coeur contient son centre, et il y est entier tant
+    qu'il est plus petit que le recouvrement."""
+    axes = []
+    for length in size:
+        starts = _tile_starts(length, tile, overlap)
+        ends = [min(start + tile, length) for start in starts]
+        cuts = [0] + [(ends[i] + starts[i + 1]) // 2 for i in range(len(starts) - 1)] + [length]
+        axes.append([(starts[i], ends[i], cuts[i], cuts[i + 1]) for i in range(len(starts))])
+    return [((x0, y0, x1, y1), (cx0, cy0, cx1, cy1))
+            for y0, y1, cy0, cy1 in axes[1]
+            for x0, x1, cx0, cx1 in axes[0]]
+
+
+def stitch_words(words):
+    """Texte reconstruit à partir de mots positionnés (left, top, width, height, text) :
+    lignes regroupées par position verticale, mots triés de gauche à droite, ligne vide
+    entre deux lignes nettement espacées (paragraphes)."""
+    if not words:
+        return ""
+    line_height = float(np.median([w[3] for w in words]))
+    lines = []  # [centre vertical moyen, mots]
+    for word in sorted(words, key=lambda w: w[1] + w[3] / 2):
+        center = word[1] + word[3] / 2
+        if lines and abs(center - lines[-1][0]) <= line_height / 2:
+            line = lines[-1]
+            line[1].append(word)
+            line[0] += (center - line[0]) / len(line[1])
+        else:
+            lines.append([center, [word]])
+
+    out, previous = [], None
+    for center, line_words in lines:
+        if previous is not None and center - previous > 2 * line_height:
+            out.append("")
+        out.append(" ".join(w[4] for w in sorted(line_words, key=lambda w: w[0])))
+        previous = center
+    return "\n".join(out)
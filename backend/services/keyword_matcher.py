@@ -0,0 +1,87 @@
+import re
+from collections import Counter
+
+
+def _trie_pattern(words):
+    """Expression régulière en forme de trie : à une position donnée, un seul chemin est
+    possible (préfixes factorisés) et le mot le plus long est préféré."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node):
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        group = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            # Optionnel et glouton : le mot le plus long d'abord, le préfixe s'il échoue
+            return "(?:" + group + ")?"
+        return group
+
+    return build(trie)
+
+
+def _has_border(word):
+    """Vrai si deux occurrences du mot peuvent se chevaucher (un préfixe propre est aussi suffixe)."""
+    return any(word[:i] == word[-i:] for i in range(1, len(word)))
+
+
+class KeywordMatcher:
+    """Table de mots-clés {catégorie: [mots-clés]} compilée en une seule expression régulière.
+
+    Score d'une catégorie = somme, sur ses mots-clés, du nombre d'occurrences x poids
+    (2 si le mot-clé fait plus de 4 caractères, sinon 1) : exactement les mêmes scores que
+    `text.count(kw.lower())` mot-clé par mot-clé, mais en un seul parcours du texte.
+
+    Le parcours donne, à chaque position où un mot-clé commence, le plus long ; les mots-clés
+    qui en sont des préfixes commencent là aussi. Les occurrences de mots-clés différents sont
+    toutes comptées. Celles d'un même mot-clé ne peuvent se chevaucher que s'il a un bord
+    (ex. « ticket » : t...t) ; ces rares mots-clés gardent `str.count` pour compter exactement
+    comme lui (occurrences non chevauchantes).
+    """
+
+    def __init__(self, categories):
+        self.categories = list(categories)
+        # mot-clé (minuscule) -> [(catégorie, poids)] ; un mot-clé peut servir à plusieurs catégories
+        self._targets = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                pattern = keyword.lower()
+                if pattern:
+                    self._targets.setdefault(pattern, []).append((category, 2 if len(keyword) > 4 else 1))
+
+        words = sorted(self._targets)
+        self._bordered = [word for word in words if _has_border(word)]
+        bordered = set(self._bordered)
+        # mot-clé -> mots-clés sans bord qui en sont des préfixes (lui compris) : ils commencent
+        # à la même position
+        self._prefixes = {word: [other for other in words if word.startswith(other) and other not in bordered]
+                          for word in words}
+        self._regex = re.compile("(?=(" + _trie_pattern(words) + "))") if words else None
+
+    def counts(self, text):
+        """Nombre d'occurrences non chevauchantes de chaque mot-clé (comme str.count)."""
+        counts = Counter()
+        if self._regex is None:
+            return counts
+        for longest, hits in Counter(self._regex.findall(text)).items():
+            for word in self._prefixes[longest]:
+                counts[word] += hits
+        for word in self._bordered:
+            hits = text.count(word)
+            if hits:
+                counts[word] = hits
+        return counts
+
+    def scores(self, text):
+        """Score pondéré de chaque catégorie (0 pour les catégories sans occurrence)."""
+        scores = {category: 0 for category in self.categories}
+        for word, count in self.counts(text).items():
+            for category, weight in self._targets[word]:
+                scores[category] += count * weight
+        return scores
@@ -0,0 +1,62 @@
+import re
+import threading
+
+# Mots outils très fréquents et propres à chaque langue (les mots communs aux deux, ex. "on", "a", sont exclus)
+STOP_WORDS = {
+    "fra": {
+        "le", "la", "les", "de", "des", "du", "un", "une", "et", "est", "en", "que", "qui", "dans",
+        "pour", "pas", "sur", "au", "aux", "avec", "ce", "cette", "il", "elle", "nous", "vous", "ils",
+        "sont", "par", "plus", "ne", "se", "sa", "ses", "leur", "été", "être", "ou", "mais", "votre", "notre"
+    },
+    "eng": {
+        "the", "of", "and", "to", "in", "is", "that", "it", "for", "with", "was", "be", "by", "this",
+        "are", "or", "from", "at", "an", "have", "not", "which", "you", "your", "our", "we", "will",
+        "has", "their", "they", "been", "would", "there", "these", "all"
+    },
+}
+
+_WORD_RE = re.compile(r"[a-zàâäéèêëîïôöùûüçœæ]+")
+
+
+def language_scores(text):
+    """Proportion de mots outils de chaque langue dans le texte."""
+    words = _WORD_RE.findall((text or "").lower())
+    if not words:
+        return {lang: 0.0 for lang in STOP_WORDS}
+    return {lang: sum(w in stops for w in words) / len(words) for lang, stops in STOP_WORDS.items()}
+
+
+def detect_language(text, languages=("fra", "eng"), min_ratio=0.05, margin=2.0, min_words=8):
+    """Langue dominante parmi `languages`, ou None si le texte est trop court ou ambigu
+    (bilingue, peu de mots outils) : l'appelant utilise alors le modèle combiné."""
+    if len(_WORD_RE.findall((text or "").lower())) < min_words:
+        return None
+    scores = {lang: score for lang, score in language_scores(text).items() if lang in languages}
+    if not scores:
+        return None
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best, best_score = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+    if best_score >= min_ratio and best_score >= margin * runner_up:
+        return best
+    return None
+
+
+class DocumentLanguage:
+    """Langue partagée par les pages d'un même document : la première page qui en a besoin
+    la détecte, les suivantes (y compris dans d'autres threads) la réutilisent."""
+
+    def __init__(self, lang=None, resolved=False):
+        # resolved=True : la langue a déjà été décidée ailleurs (None = modèle combiné, sans détection)
+        self.lang = lang
+        self._resolved = resolved or lang is not None
+        self._lock = threading.Lock()
+
+    def resolve(self, detect):
+        if self._resolved:
+            return self.lang
+        with self._lock:
+            if not self._resolved:
+                self.lang = detect()
+                self._resolved = True
+            return self.lang
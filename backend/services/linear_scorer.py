@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import logging
+import numpy as np
+
+META_FILE = "scorer.json"
+
+
+def _expit(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _softmax(x):
+    x = x - x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+def _vectorizer_settings(vectorizer):
+    """Réglages d'un TfidfVectorizer reproductibles sans sklearn, ou None s'ils ne le sont pas."""
+    params = vectorizer.get_params()
+    if (type(vectorizer).__name__ != "TfidfVectorizer" or params["analyzer"] != "word"
+            or params["tokenizer"] or params["preprocessor"] or params["strip_accents"]
+            or params["binary"] or params["sublinear_tf"] or not params["use_idf"]
+            or params["norm"] not in ("l2", None) or params["input"] != "content"):
+        return None
+    stop_words = vectorizer.get_stop_words()
+    return {
+        "token_pattern": params["token_pattern"],
+        "lowercase": params["lowercase"],
+        "ngram_range": list(params["ngram_range"]),
+        "stop_words": sorted(stop_words) if stop_words else [],
+        "norm": params["norm"],
+    }
+
+
+def _calibrated_folds(clf, n_classes):
+    """Coefficients et paramètres de Platt de chaque pli d'un CalibratedClassifierCV(sigmoid),
+    remis à l'échelle de toutes les classes (classe absente d'un pli : present=False)."""
+    folds = clf.calibrated_classifiers_
+    n_features = folds[0].estimator.coef_.shape[1]
+    coef = np.zeros((len(folds), n_classes, n_features))
+    intercept = np.zeros((len(folds), n_classes))
+    a = np.zeros((len(folds), n_classes))
+    b = np.zeros((len(folds), n_classes))
+    present = np.zeros((len(folds), n_classes), dtype=bool)
+    classes = list(clf.classes_)
+    for f, fold in enumerate(folds):
+        estimator = fold.estimator
+        if (fold.method != "sigmoid" or not hasattr(estimator, "decision_function")
+                or not hasattr(estimator, "coef_")):
+            return None
+        indices = [classes.index(c) for c in estimator.classes_]
+        if n_classes == 2:
+            # Binaire : une seule fonction de décision, celle de la classe positive
+            indices = [1]
+        elif len(indices) != estimator.coef_.shape[0]:
+            return None
+        for row, k in enumerate(indices):
+            calibrator = fold.calibrators[row]
+            coef[f, k] = estimator.coef_[row]
+            intercept[f, k] = estimator.intercept_[row]
+            a[f, k], b[f, k] = calibrator.a_, calibrator.b_
+            present[f, k] = True
+    return {"coef": coef, "intercept": intercept, "a": a, "b": b, "present": present}
+
+
+def export_linear(pipeline, directory):
+    """Exporte un Pipeline(TfidfVectorizer, classifieur linéaire) en artefact compact :
+    vocabulaire trié, IDF et coefficients en .npy, réglages en JSON.
+
+    Classifieurs pris en charge : LogisticRegression et CalibratedClassifierCV(sigmoid) sur un
+    modèle linéaire (SGD). Retourne False sans rien écrire pour les autres (ex. RandomForest),
+    qui restent servis par sklearn.
+    """
+    steps = getattr(pipeline, "steps", None)
+    if not steps or len(steps) != 2:
+        return False
+    vectorizer, clf = steps[0][1], steps[1][1]
+    settings = _vectorizer_settings(vectorizer)
+    if settings is None:
+        return False
+
+    classes = list(clf.classes_)
+    arrays = {}
+    if type(clf).__name__ == "LogisticRegression":
+        kind = "logistic"
+        arrays["coef"] = np.asarray(clf.coef_, dtype=np.float64)
+        arrays["intercept"] = np.asarray(clf.intercept_, dtype=np.float64)
+    elif type(clf).__name__ == "CalibratedClassifierCV":
+        kind = "calibrated"
+        folds = _calibrated_folds(clf, len(classes))
+        if folds is None:
+            return False
+        arrays.update(folds)
+    else:
+        return False
+
+    # Ordre des colonnes sklearn = vocabulaire trié (sort_features) : l'index d'un terme est
+    # sa position dans le tableau trié, retrouvée par recherche dichotomique
+    vocabulary = np.asarray(vectorizer.get_feature_names_out(), dtype=str)
+    if not np.array_equal(vocabulary, np.sort(vocabulary)) or any(
+            vectorizer.vocabulary_[term] != i for i, term in enumerate(vocabulary)):
+        return False
+    arrays["vocabulary"] = vocabulary
+    arrays["idf"] = np.asarray(vectorizer.idf_, dtype=np.float64)
+
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array, allow_pickle=False)
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"kind": kind, "classes": [str(c) for c in classes], **settings}, f, ensure_ascii=False, indent=2)
+    return True
+
+
+class LinearScorer:
+    """Scoreur TF-IDF + modèle linéaire en NumPy seul, chargé depuis un artefact `export_linear`.
+
+    Les tableaux sont ouverts avec mmap_mode : plusieurs workers partagent les mêmes pages du
+    cache disque, sans import de sklearn ni dictionnaire Python de vocabulaire. Mêmes
+    `classes_`, `predict_proba` et `predict` que le Pipeline exporté (aux arrondis près).
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.kind = meta["kind"]
+        self.classes_ = np.asarray(meta["classes"])
+        self._token_pattern = re.compile(meta["token_pattern"])
+        self._lowercase = meta["lowercase"]
+        self._ngram_range = tuple(meta["ngram_range"])
+        self._stop_words = frozenset(meta["stop_words"])
+        self._norm = meta["norm"]
+
+        def array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+
+        self._vocabulary = array("vocabulary")
+        self._idf = array("idf")
+        self._coef = array("coef")
+        self._intercept = array("intercept")
+        if self.kind == "calibrated":
+            self._a, self._b, self._present = array("a"), array("b"), array("present")
+
+    @property
+    def n_features(self):
+        return self._vocabulary.shape[0]
+
+    def _terms(self, text):
+        """Mêmes termes (unigrammes, n-grammes) que l'analyseur 'word' de sklearn."""
+        if self._lowercase:
+            text = text.lower()
+        tokens = [t for t in self._token_pattern.findall(text) if t not in self._stop_words]
+        min_n, max_n = self._ngram_range
+        terms = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n + 1, len(tokens) + 1)):
+            terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def _features(self, text):
+        """Vecteur TF-IDF creux d'un texte : (indices de colonnes, poids)."""
+        terms = self._terms(text)
+        if not terms:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        terms = np.asarray(terms)
+        positions = np.searchsorted(self._vocabulary, terms)
+        positions[positions >= self.n_features] = 0
+        known = positions[self._vocabulary[positions] == terms]
+        columns, counts = np.unique(known, return_counts=True)
+        weights = counts * self._idf[columns]
+        if self._norm == "l2" and weights.size:
+            weights /= np.sqrt(np.dot(weights, weights))
+        return columns, weights
+
+    def _decision(self, coef, intercept, features):
+        scores = np.empty((len(features), coef.shape[0]))
+        for i, (columns, weights) in enumerate(features):
+            scores[i] = coef[:, columns] @ weights
+        return scores + intercept
+
+    def predict_proba(self, texts):
+        features = [self._features(text) for text in texts]
+        if self.kind == "logistic":
+            decision = self._decision(self._coef, self._intercept, features)
+            if decision.shape[1] == 1:
+                positive = _expit(decision[:, 0])
+                return np.column_stack([1.0 - positive, positive])
+            return _softmax(decision)
+
+        # Moyenne des plis calibrés (Platt : expit(-(a*d + b))), comme CalibratedClassifierCV
+        n_classes = len(self.classes_)
+        mean_proba = np.zeros((len(texts), n_classes))
+        for f in range(self._coef.shape[0]):
+            decision = self._decision(self._coef[f], self._intercept[f], features)
+            proba = np.where(self._present[f], _expit(-(self._a[f] * decision + self._b[f])), 0.0)
+            if n_classes == 2:
+                proba[:, 0] = 1.0 - proba[:, 1]
+            else:
+                denominator = proba.sum(axis=1, keepdims=True)
+                proba = np.divide(proba, denominator, out=np.full_like(proba, 1 / n_classes),
+                                  where=denominator != 0)
+            proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+            mean_proba += proba
+        return mean_proba / self._coef.shape[0]
+
+    def predict(self, texts):
+        return self.classes_[np.argmax(self.predict_proba(texts), axis=1)]
+
+
+def load_linear(directory):
+    """LinearScorer si `directory` contient un artefact exporté, sinon None."""
+    if not os.path.exists(os.path.join(directory, META_FILE)):
+        return None
+    try:
+        return LinearScorer(directory)
+    except Exception as e:
+        logging.warning(f"Scoreur linéaire illisible dans {directory} : {e}")
+        return None
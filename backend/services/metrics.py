@@ -0,0 +1,63 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Compteurs et chronos en mémoire, thread-safe.
+
+    Les workers OCR tournent dans d'autres processus : ils vident (`drain`) leurs
+    métriques à la fin de chaque job et le processus principal les fusionne (`merge`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = {}  # nom -> [nombre, total_secondes, max_secondes]
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            count, total, peak = self._timings.get(name, (0, 0.0, 0.0))
+            self._timings[name] = [count + 1, total + seconds, max(peak, seconds)]
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def drain(self):
+        """Retourne les métriques brutes accumulées et remet tout à zéro."""
+        with self._lock:
+            delta = {"counters": self._counters, "timings": self._timings}
+            self._counters, self._timings = {}, {}
+            return delta
+
+    def merge(self, delta):
+        if not delta:
+            return
+        with self._lock:
+            for name, value in delta.get("counters", {}).items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for name, (count, total, peak) in delta.get("timings", {}).items():
+                c, t, p = self._timings.get(name, (0, 0.0, 0.0))
+                self._timings[name] = [c + count, t + total, max(p, peak)]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {
+                    name: {"count": count, "total_s": round(total, 4),
+                           "avg_s": round(total / count, 4) if count else 0.0, "max_s": round(peak, 4)}
+                    for name, (count, total, peak) in self._timings.items()
+                },
+            }
+
+ocr_metrics = Metrics()
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+from joblib import dump, load
+from .linear_scorer import load_linear
+
+MODEL_FILE = "model.joblib"
+META_FILE = "meta.json"
+CURRENT_FILE = "CURRENT"
+LINEAR_DIR = "linear"
+
+
+def dataset_hash(texts, labels):
+    """Empreinte SHA-256 (16 hex) des données d'entraînement, pour tracer un modèle jusqu'à son dataset."""
+    digest = hashlib.sha256()
+    for text, label in zip(texts, labels):
+        digest.update(str(label).encode("utf-8"))
+        digest.update(b"\x1f")
+        digest.update(str(text).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()[:16]
+
+
+def _write_atomic(path, data):
+    """Écrit un fichier texte via un fichier temporaire + os.replace (jamais lu à moitié écrit)."""
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    """Modèles versionnés sur disque : un dossier par version (modèle + métadonnées JSON) et un
+    fichier CURRENT désignant la version active.
+
+    - `publish` écrit la version dans un dossier temporaire puis le renomme : une version
+      visible est toujours complète. Un entraînement ne réécrit jamais un modèle en service.
+    - `activate` remplace CURRENT de façon atomique ; l'historique des activations permet
+      le retour arrière.
+    - Une version peut contenir en plus un scoreur linéaire compact (dossier `linear`) :
+      `load` le préfère au Pipeline sklearn, sauf MODEL_LINEAR_SCORER=0.
+    - MODEL_REGISTRY_DIR : dossier du registre (par défaut backend/models/registry).
+    """
+
+    def __init__(self, directory=None):
+        if directory is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            directory = os.getenv("MODEL_REGISTRY_DIR", os.path.join(base_dir, "models", "registry"))
+        self.directory = directory
+        self.prefer_linear = os.getenv("MODEL_LINEAR_SCORER", "1") == "1"
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def publish(self, model, metadata=None, activate=True, export=None, extras=None):
+        """Enregistre une nouvelle version et retourne son identifiant (horodatage + suffixe).
+        `export(model, dossier)` écrit en plus l'artefact du scoreur linéaire s'il le peut ;
+        `extras` {nom: objet} : états annexes sauvegardés avec la version (voir `load_extra`)."""
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        version = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}{uuid.uuid4().hex[:4]}"
+        meta = dict(metadata or {})
+        meta.setdefault("trained_at", time.strftime("%Y-%m-%dT%H:%M:%S"))
+        meta["version"] = version
+
+        tmp_dir = self._path(f".{version}.tmp")
+        os.makedirs(tmp_dir)
+        try:
+            dump(model, os.path.join(tmp_dir, MODEL_FILE))
+            meta["scorer"] = "linear" if export and export(model, os.path.join(tmp_dir, LINEAR_DIR)) else "sklearn"
+            for name, obj in (extras or {}).items():
+                dump(obj, os.path.join(tmp_dir, f"{name}.joblib"))
+            with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+            os.rename(tmp_dir, self._path(version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        logging.info(f"Registre : version {version} publiée ({meta.get('model')}, score {meta.get('score')})")
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def versions(self):
+        """Métadonnées de toutes les versions publiées, de la plus ancienne à la plus récente."""
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.directory)):
+            try:
+                result.append(self.metadata(name))
+            except (OSError, ValueError):
+                continue  # dossier temporaire, fichier CURRENT, version incomplète
+        return result
+
+    def metadata(self, version):
+        with open(self._path(version, META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+
+    def current(self):
+        """Version active (None si le registre est vide)."""
+        try:
+            with open(self._path(CURRENT_FILE), encoding="utf-8") as f:
+                lines = f.read().split()
+        except FileNotFoundError:
+            return None
+        return lines[-1] if lines else None
+
+    def history(self):
+        """Versions activées successivement (la dernière est la version active)."""
+        try:
+            with open(self._path(CURRENT_FILE), encoding="utf-8") as f:
+                return f.read().split()
+        except FileNotFoundError:
+            return []
+
+    def activate(self, version):
+        """Désigne `version` comme active (remplacement atomique de CURRENT)."""
+        if not os.path.exists(self._path(version, MODEL_FILE)):
+            raise ValueError(f"Version inconnue : {version}")
+        history = [v for v in self.history() if v != version] + [version]
+        _write_atomic(self._path(CURRENT_FILE), "\n".join(history[-50:]) + "\n")
+        logging.info(f"Registre : version active {version}")
+
+    def previous(self):
+        """Version active avant la version courante (None s'il n'y en a pas)."""
+        history = self.history()
+        return history[-2] if len(history) >= 2 else None
+
+    def rollback(self):
+        """Réactive la version précédente et la retourne (ValueError s'il n'y en a pas)."""
+        history = self.history()
+        if len(history) < 2:
+            raise ValueError("Aucune version précédente")
+        _write_atomic(self._path(CURRENT_FILE), "\n".join(history[:-1]) + "\n")
+        logging.info(f"Registre : retour à la version {history[-2]} (depuis {history[-1]})")
+        return history[-2]
+
+    def remove(self, version):
+        """Supprime une version qui n'a jamais été activée (ValueError sinon)."""
+        if version in self.history():
+            raise ValueError(f"Version {version} dans l'historique d'activation")
+        shutil.rmtree(self._path(version), ignore_errors=True)
+
+    def load_extra(self, version, name, default=None):
+        path = self._path(version, f"{name}.joblib")
+        return load(path) if os.path.exists(path) else default
+
+    def load(self, version):
+        """Scoreur linéaire NumPy (mmap, sans sklearn) s'il existe, sinon le Pipeline sklearn complet."""
+        if self.prefer_linear:
+            scorer = load_linear(self._path(version, LINEAR_DIR))
+            if scorer is not None:
+                return scorer
+        return load(self._path(version, MODEL_FILE))
+
+
+model_registry = ModelRegistry()
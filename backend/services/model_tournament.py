@@ -0,0 +1,50 @@
+import io
+import os
+import time
+from joblib import Parallel, delayed, dump, load
+
+
+def fit_candidate(name, model, X_train, y_train, X_test, y_test):
+    """Job exécuté dans un worker : entraîne un candidat sur les features déjà vectorisées.
+    Retourne (nom, modèle entraîné, précision sur le test, durée d'entraînement en secondes).
+    L'estimateur reçu n'est jamais modifié : avec n_jobs=1, joblib exécute le job dans le
+    processus appelant, sans copie, et le modèle retourné serait sinon celui de l'appelant."""
+    from sklearn.base import clone
+
+    model = clone(model)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    seconds = time.perf_counter() - start
+    return name, model, model.score(X_test, y_test), seconds
+
+
+def train_candidates(models, X_train, y_train, X_test, y_test, n_jobs=None):
+    """Entraîne les candidats {nom: estimateur} en parallèle (pool de processus joblib/loky).
+
+    Les matrices creuses sont calculées une seule fois par l'appelant et partagées par tous les
+    candidats. Résultats dans l'ordre de `models`. n_jobs : TRAIN_JOBS, ou un worker par
+    candidat dans la limite des cœurs disponibles.
+    """
+    if n_jobs is None:
+        n_jobs = int(os.getenv("TRAIN_JOBS", "0")) or min(len(models), os.cpu_count() or 1)
+    return Parallel(n_jobs=n_jobs, backend="loky")(
+        delayed(fit_candidate)(name, model, X_train, y_train, X_test, y_test)
+        for name, model in models.items()
+    )
+
+
+def measure_pipeline(pipeline, texts):
+    """Coût de service d'un pipeline entraîné : taille sérialisée (octets), temps de chargement
+    (s) et latence moyenne par document (ms) de predict_proba sur `texts`."""
+    buffer = io.BytesIO()
+    dump(pipeline, buffer)
+    size = buffer.tell()
+    buffer.seek(0)
+    start = time.perf_counter()
+    load(buffer)
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for text in texts:
+        pipeline.predict_proba([text])
+    latency_ms = (time.perf_counter() - start) * 1000 / max(len(texts), 1)
+    return size, load_seconds, latency_ms
@@ -1,190 +1,804 @@
-import pytesseract
 from PIL import Image
 import io
 import os
+import copy
 import logging
+import json
+import hashlib
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import ocr_metrics
+from .language import DocumentLanguage, detect_language
+from .ocr_backends import get_ocr_backend
+from .ocr_result import OCRResult, DocumentBudget
+from .debug_artifacts import debug_artifacts
+
+# A incrémenter à chaque changement de logique de prétraitement/OCR (invalide le cache)
+OCR_PIPELINE_VERSION = "V5"
 
 class OCREngine:
+    def __init__(self):
+        # Pipeline PDF scanné : rasterisation page par page (mémoire constante)
+        self.pdf_dpi = int(os.getenv("OCR_PDF_DPI", "300"))
+        self.pdf_page_window = max(1, int(os.getenv("OCR_PDF_PAGE_WINDOW", "1")))
+        self.pdf_page_workers = max(1, int(os.getenv("OCR_PDF_PAGE_WORKERS", "2")))
+        # PDF hybride : une page garde sa couche texte native si elle est exploitable
+        self.pdf_text_min_chars = int(os.getenv("OCR_PDF_TEXT_MIN_CHARS", "30"))
+        self.pdf_text_min_alnum = float(os.getenv("OCR_PDF_TEXT_MIN_ALNUM", "0.6"))
+        # Seconde passe OCR (autre prétraitement) seulement si la confiance moyenne des mots est trop basse
+        self.min_confidence = float(os.getenv("OCR_MIN_CONFIDENCE", "60"))
+        # Débruitage selon le bruit estimé : rien / médian / NL-means (le plus coûteux)
+        self.denoise_skip_below = float(os.getenv("OCR_DENOISE_SKIP_BELOW", "2.0"))
+        self.denoise_nlmeans_above = float(os.getenv("OCR_DENOISE_NLMEANS_ABOVE", "8.0"))
+        self._nlmeans_cost_per_mpx = 1.3  # secondes/mégapixel, affiné à chaque NL-means réel
+        # Normalisation de résolution : hauteur de caractère cible pour Tesseract + plafond mémoire
+        self.target_text_height = float(os.getenv("OCR_TARGET_TEXT_HEIGHT", "24"))
+        self.max_megapixels = float(os.getenv("OCR_MAX_MEGAPIXELS", "25"))
+        # Redressement (orientation + inclinaison) avant l'OCR
+        self.deskew = os.getenv("OCR_DESKEW", "1") == "1"
+        self.deskew_max_angle = float(os.getenv("OCR_DESKEW_MAX_ANGLE", "10"))
+        # Langues : modèle combiné par défaut, une seule langue quand elle est détectée avec certitude
+        self.languages = os.getenv("OCR_LANGS", "fra+eng")
+        self.lang_detect = os.getenv("OCR_LANG_DETECT", "1") == "1"
+        # Backend Tesseract : tesserocr (API en processus, handles persistants) ou pytesseract
+        self.backend = get_ocr_backend(os.getenv("OCR_BACKEND", "auto"))
+        # Détection des blocs de texte : seules les zones de texte sont envoyées à Tesseract
+        self.region_detect = os.getenv("OCR_REGIONS", "1") == "1"
+        self.region_max_coverage = float(os.getenv("OCR_REGIONS_MAX_COVERAGE", "0.5"))
+        self.region_max_count = int(os.getenv("OCR_REGIONS_MAX_COUNT", "12"))
+        self.region_workers = max(1, int(os.getenv("OCR_REGIONS_WORKERS", "2")))
+        # Nombre max de pages OCRisées par document (None = toutes)
+        self.max_pages = None
+        # Mode « assez pour classer » : la lecture de la couche texte s'arrête après ce nombre de
+        # caractères ou de pages (None = document entier)
+        self.text_enough_chars = None
+        self.text_enough_pages = None
+        # Très grandes images : OCR par tuiles recouvrantes au lieu d'une réduction de résolution
+        self.tile_min_megapixels = float(os.getenv("OCR_TILE_MIN_MEGAPIXELS", "25"))
+        self.tile_size = int(os.getenv("OCR_TILE_SIZE", "2400"))
+        self.tile_overlap = int(os.getenv("OCR_TILE_OVERLAP", "200"))
+        # Couche texte des gros PDF répartie par tranches de pages sur les workers (si page_executor)
+        self.pdf_text_chunk_pages = max(1, int(os.getenv("OCR_PDF_TEXT_CHUNK_PAGES", "8")))
+        self.pdf_text_parallel_min_pages = int(os.getenv("OCR_PDF_TEXT_PARALLEL_MIN_PAGES", "32"))
+        # Budget de temps par document (0 = illimité) et réglages des paliers de dégradation
+        self.doc_budget = float(os.getenv("OCR_DOC_BUDGET", "60"))
+        self.ladder_pdf_dpi = int(os.getenv("OCR_LADDER_PDF_DPI", "200"))
+        self.ladder_max_megapixels = float(os.getenv("OCR_LADDER_MAX_MEGAPIXELS", "8"))
+        self.ladder_first_pages = max(1, int(os.getenv("OCR_LADDER_FIRST_PAGES", "3")))
+        self.ladder_level = 0
+        # Exécuteur de pages (OCRExecutor) : si défini, les pages rasterisées partent vers les
+        # workers en mémoire partagée au lieu d'être OCRisées dans ce processus
+        self.page_executor = None
+
+    def settings(self):
+        """Réglages ayant un impact sur le texte produit (la parallélisation n'en fait pas partie).
+        Le budget et les paliers de dégradation non plus : un résultat dégradé n'est jamais mis en cache."""
+        return {
+            "pipeline": OCR_PIPELINE_VERSION,
+            "backend": self.backend.name,
+            "lang": self.languages,
+            "lang_detect": self.lang_detect,
+            "max_pages": self.max_pages,
+            "text_enough_chars": self.text_enough_chars,
+            "text_enough_pages": self.text_enough_pages,
+            "regions": self.region_detect,
+            "region_max_coverage": self.region_max_coverage,
+            "region_max_count": self.region_max_count,
+            "pdf_dpi": self.pdf_dpi,
+            "pdf_text_min_chars": self.pdf_text_min_chars,
+            "pdf_text_min_alnum": self.pdf_text_min_alnum,
+            "min_confidence": self.min_confidence,
+            "denoise_skip_below": self.denoise_skip_below,
+            "denoise_nlmeans_above": self.denoise_nlmeans_above,
+            "target_text_height": self.target_text_height,
+            "max_megapixels": self.max_megapixels,
+            "tile_min_megapixels": self.tile_min_megapixels,
+            "tile_size": self.tile_size,
+            "tile_overlap": self.tile_overlap,
+            "deskew": self.deskew,
+            "deskew_max_angle": self.deskew_max_angle,
+        }
+
+    def fast_variant(self):
+        """Profil « premier coup d'oeil » de la cascade : assez de texte pour classer (lecture de la
+        couche texte arrêtée tôt), 1re page seulement pour l'OCR, basse résolution,
+        pas de débruitage ni de seconde passe. Les très grandes images sont réduites, jamais découpées
+        en tuiles pleine résolution (la passe complète le ferait de toute façon en cas d'escalade)."""
+        fast = copy.copy(self)
+        fast.max_pages = 1
+        fast.text_enough_chars = int(os.getenv("OCR_FAST_TEXT_CHARS", "4000"))
+        fast.text_enough_pages = int(os.getenv("OCR_FAST_TEXT_PAGES", "3"))
+        fast.pdf_dpi = int(os.getenv("OCR_FAST_PDF_DPI", "150"))
+        fast.max_megapixels = min(self.max_megapixels, float(os.getenv("OCR_FAST_MAX_MEGAPIXELS", "4")))
+        fast.tile_min_megapixels = 0
+        fast.denoise_skip_below = float("inf")
+        fast.min_confidence = 0.0
+        return fast
+
+    def degraded(self, level):
+        """Moteur du palier `level` de l'échelle de dégradation (0 = pleine qualité, inchangé).
+        1 : résolution réduite (très grandes images réduites au lieu d'être découpées en tuiles) ;
+        2 : en plus, ni débruitage ni seconde passe ;
+        3 (premières pages seulement) : mêmes réglages, la limite est appliquée par DocumentBudget."""
+        if level == 0:
+            return self
+        engine = copy.copy(self)
+        engine.ladder_level = level
+        engine.pdf_dpi = min(self.pdf_dpi, self.ladder_pdf_dpi)
+        engine.max_megapixels = min(self.max_megapixels, self.ladder_max_megapixels)
+        engine.tile_min_megapixels = 0
+        if level >= 2:
+            engine.denoise_skip_below = float("inf")
+            engine.min_confidence = 0.0
+        return engine
+
+    def new_budget(self):
+        return DocumentBudget(self.doc_budget, first_pages=self.ladder_first_pages)
+
+    def config_version(self):
+        """Empreinte courte des réglages : sert de version au cache OCR."""
+        payload = json.dumps(self.settings(), sort_keys=True).encode()
+        return hashlib.sha256(payload).hexdigest()[:12]
+
     def deskew_image(self, image):
-        """Redresse une image si elle est inclinée (Deskewing)."""
+        """Redresse une image (orientation 90/180/270 + inclinaison fine).
+        L'analyse se fait sur une vignette binaire : seule la rotation finale touche la pleine résolution."""
         try:
-            import cv2
-            import numpy as np
-            
-            # Convert PIL to OpenCV
-            open_cv_image = np.array(image.convert('RGB')) 
-            # Convert RGB to BGR 
-            open_cv_image = open_cv_image[:, :, ::-1].copy() 
-            
-            # Convert to gray
-            gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
-                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                    
-            # Flip colors (foreground must be white)
-            gray = cv2.bitwise_not(gray)
-            
-            # Thresholding
-            thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
-            
-            # Find coordinates of all non-zero pixels
-            coords = np.column_stack(np.where(thresh > 0))
-            
-            # Min Area Rect
-            angle = cv2.minAreaRect(coords)[-1]
-            
-            # Adjust angle
-            if angle < -45:
-                angle = -(90 + angle)
-            else:
-                angle = -angle
-                
-            logging.info(f"Deskew: Angle détecté = {angle:.2f} degrés")
-            
+            from .image_analysis import thumbnail_gray, detect_orientation
+
+            with ocr_metrics.timer("ocr.deskew.detect"):
+                orientation, angle = detect_orientation(thumbnail_gray(image, 1000), max_angle=self.deskew_max_angle)
+            logging.info(f"Deskew: orientation = {orientation}°, angle détecté = {angle:.2f} degrés")
+
+            if orientation:
+                ocr_metrics.incr(f"ocr.orientation.{orientation}")
+                transpose = {90: Image.Transpose.ROTATE_90, 180: Image.Transpose.ROTATE_180,
+                             270: Image.Transpose.ROTATE_270}[orientation]
+                image = image.transpose(transpose)
+
             # Correction si l'angle est significatif (> 0.5 deg)
             if abs(angle) > 0.5:
-                (h, w) = open_cv_image.shape[:2]
-                center = (w // 2, h // 2)
-                M = cv2.getRotationMatrix2D(center, angle, 1.0)
-                rotated = cv2.warpAffine(open_cv_image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-                
-                # Convert back to PIL
-                return Image.fromarray(cv2.cvtColor(rotated, cv2.COLOR_BGR2RGB))
-            
+                ocr_metrics.incr("ocr.deskew.rotated")
+                image = image.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor='white')
             return image
             
         except Exception as e:
             logging.warning(f"Deskew failed: {e}")
             return image
 
+    def denoise(self, gray):
+        """Débruitage proportionné au bruit mesuré :
+        - image propre (capture d'écran, PDF numérique) : aucun filtre
+        - bruit léger : filtre médian 3x3 (quasi gratuit)
+        - scan vraiment bruité : NL-means complet
+        Chaque choix est compté et le temps économisé par rapport à NL-means est estimé."""
+        import cv2
+        from .image_analysis import estimate_noise, center_crop
+
+        noise = estimate_noise(center_crop(gray))
+        if noise < self.denoise_skip_below:
+            choice = 'skip'
+        elif noise < self.denoise_nlmeans_above:
+            choice = 'median'
+        else:
+            choice = 'nlmeans'
+
+        start = time.perf_counter()
+        if choice == 'median':
+            gray = cv2.medianBlur(gray, 3)
+        elif choice == 'nlmeans':
+            gray = cv2.fastNlMeansDenoising(gray, None, 5, 7, 21)
+        elapsed = time.perf_counter() - start
+
+        mpx = gray.size / 1e6
+        ocr_metrics.incr(f"ocr.denoise.{choice}")
+        ocr_metrics.observe(f"ocr.denoise.{choice}", elapsed)
+        if choice == 'nlmeans':
+            # Moyenne glissante du coût réel par mégapixel sur cette machine
+            self._nlmeans_cost_per_mpx = 0.8 * self._nlmeans_cost_per_mpx + 0.2 * elapsed / max(mpx, 1e-6)
+        else:
+            ocr_metrics.incr("ocr.denoise.saved_s", max(0.0, self._nlmeans_cost_per_mpx * mpx - elapsed))
+        logging.debug(f"Débruitage : {choice} (bruit estimé {noise:.1f})")
+        return gray
+
+    def normalization_scale(self, gray):
+        """Facteur d'échelle amenant les caractères à la hauteur cible (remplace l'upscaling 2x aveugle)."""
+        from .image_analysis import estimate_text_height, resolution_scale
+
+        with ocr_metrics.timer("ocr.normalize.estimate"):
+            text_height = estimate_text_height(gray)
+        scale = resolution_scale(gray.shape, text_height, self.target_text_height, self.max_megapixels)
+        logging.debug(f"Hauteur de texte estimée : {text_height} px -> échelle {scale:.2f}")
+        return scale
+
+    def resample(self, gray, scale):
+        import cv2
+
+        if scale == 1.0:
+            ocr_metrics.incr("ocr.resample.none")
+            return gray
+        ocr_metrics.incr("ocr.resample.down" if scale < 1.0 else "ocr.resample.up")
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+        return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+
+    def open_image(self, file_bytes):
+        """Ouvre une image ; les JPEG trop grands sont décodés directement à échelle réduite
+        (mode draft de PIL, réduction DCT 1/2, 1/4, 1/8) au lieu d'être décodés puis réduits."""
+        image = Image.open(io.BytesIO(file_bytes))
+        width, height = image.size
+        pixels = width * height
+        if image.format == 'JPEG' and pixels > self.max_megapixels * 1e6:
+            ratio = (self.max_megapixels * 1e6 / pixels) ** 0.5
+            image.draft(image.mode, (int(width * ratio), int(height * ratio)))
+            ocr_metrics.incr("ocr.jpeg_draft")
+            logging.debug(f"JPEG {width}x{height} décodé en draft à {image.size}")
+        return image
+
     def enhance_image(self, image, method='soft'):
         """Améliore l'image pour l'OCR.
-        - method='soft': Grayscale + Denoise (Idéal pour CVs modernes, fonds colorés).
+        - method='soft': Grayscale + Denoise adaptatif (Idéal pour CVs modernes, fonds colorés).
         - method='hard': + Adaptive Threshold (Idéal pour scans N&B, reçus).
+        `image` peut être une image PIL ou un tableau numpy (ex. vue en mémoire partagée), lu sans copie.
         """
+        import numpy as np
         try:
             import cv2
-            import numpy as np
-            
-            # Convert PIL to OpenCV
-            img_np = np.array(image.convert('RGB'))
             
-            # 1. Conversion Niveaux de Gris
-            gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
-            
-            # 2. Mise à l'échelle si trop petit (Upscaling)
-            height, width = gray.shape
-            if width < 1500 or height < 1500:
-                scale = 2.0
-                gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
-                logging.debug(f"Image upscaled by {scale}")
+            # 1. Conversion Niveaux de Gris (une page déjà en gris est lue telle quelle)
+            if isinstance(image, np.ndarray):
+                gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+            elif image.mode == 'L':
+                gray = np.asarray(image)
+            else:
+                rgb = image if image.mode == 'RGB' else image.convert('RGB')
+                gray = cv2.cvtColor(np.asarray(rgb), cv2.COLOR_RGB2GRAY)
             
-            # 3. Réduction du bruit (Denoising)
-            denoised = cv2.fastNlMeansDenoising(gray, None, 5, 7, 21)
+            # 2. Normalisation de résolution (taille des caractères) + réduction du bruit adaptée.
+            #    On réduit avant de débruiter et on agrandit après : le débruitage voit toujours
+            #    le moins de pixels possible.
+            scale = self.normalization_scale(gray)
+            if scale < 1.0:
+                gray = self.resample(gray, scale)
+                gray = self.denoise(gray)
+            else:
+                gray = self.denoise(gray)
+                gray = self.resample(gray, scale)
             
             # 4. Mode Hard : Binarisation forcée
             if method == 'hard':
-                return Image.fromarray(cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2))
+                return Image.fromarray(cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2))
             
             # Mode Soft (Défaut) : On laisse Tesseract gérer le seuillage
-            return Image.fromarray(denoised)
+            return Image.fromarray(gray)
             
         except Exception as e:
             logging.warning(f"Image enhancement failed: {e}")
-            return image
+            return Image.fromarray(image) if isinstance(image, np.ndarray) else image
 
-    def extract_from_bytes(self, file_bytes, filename=""):
-        """V5: Extraction ultra-robuste avec pypdf (Texte) + Deskewing + OCR."""
+    @staticmethod
+    def _data_to_text(data):
+        """Reconstruit le texte (lignes/paragraphes) et la confiance moyenne depuis image_to_data."""
+        lines, last_key, last_par = [], None, None
+        weighted, chars = 0.0, 0
+        for i, word in enumerate(data["text"]):
+            conf = float(data["conf"][i])
+            if conf < 0 or not word.strip():
+                continue
+            weighted += conf * len(word)
+            chars += len(word)
+            par = (data["block_num"][i], data["par_num"][i])
+            key = par + (data["line_num"][i],)
+            if key != last_key:
+                if last_par is not None and par != last_par:
+                    lines.append("")
+                lines.append(word)
+                last_key, last_par = key, par
+            else:
+                lines[-1] += " " + word
+        return "\n".join(lines), (weighted / chars if chars else 0.0)
+
+    def _tesseract(self, image, lang=None):
+        """Un seul appel Tesseract qui fournit à la fois le texte et la confiance des mots."""
+        lang = lang or self.languages
+        with ocr_metrics.timer("ocr.tesseract"):
+            data = self.backend.image_to_data(image, lang)
+        return self._data_to_text(data)
+
+    def _tesseract_regions(self, image, lang=None):
+        """OCR restreint aux blocs de texte (photos, aplats et marges ignorés), en ordre de lecture.
+        Les pages denses ou très fragmentées sont OCRisées d'un bloc."""
+        import numpy as np
+        from .image_analysis import find_text_regions
+
+        if not self.region_detect:
+            return self._tesseract(image, lang)
+        try:
+            with ocr_metrics.timer("ocr.regions.detect"):
+                regions = find_text_regions(np.asarray(image if image.mode == 'L' else image.convert('L')), max_regions=self.region_max_count,
+                                            max_coverage=self.region_max_coverage)
+        except Exception as e:
+            logging.warning(f"Détection des zones de texte échouée : {e}")
+            regions = None
+        if not regions:
+            ocr_metrics.incr("ocr.regions.full_page")
+            return self._tesseract(image, lang)
+
+        crops = [image.crop(box) for box in regions]
+        cropped_area = sum(crop.width * crop.height for crop in crops)
+        ocr_metrics.incr("ocr.regions.cropped")
+        ocr_metrics.incr("ocr.regions.blocks", len(crops))
+        ocr_metrics.incr("ocr.regions.skipped_mpx", max(0, image.width * image.height - cropped_area) / 1e6)
+
+        with ThreadPoolExecutor(max_workers=min(self.region_workers, len(crops))) as pool:
+            results = list(pool.map(lambda crop: self._tesseract(crop, lang), crops))
+        texts = [text for text, _ in results if text.strip()]
+        weight = sum(len(text) for text, _ in results)
+        confidence = sum(conf * len(text) for text, conf in results) / weight if weight else 0.0
+        return "\n\n".join(texts), confidence
+
+    def probe_language(self, image):
+        """Passe rapide basse résolution avec la première langue seule, notée au ratio de mots outils.
+        Retourne la langue détectée ou None (ambigu : modèle combiné)."""
+        from .image_analysis import thumbnail_gray
+
+        candidates = self.languages.split("+")
+        if len(candidates) < 2:
+            return None
+        with ocr_metrics.timer("ocr.lang.probe"):
+            probe = self.backend.image_to_string(Image.fromarray(thumbnail_gray(image, 1200)), candidates[0])
+        lang = detect_language(probe, languages=candidates)
+        logging.debug(f"Langue détectée : {lang or 'ambiguë'}")
+        return lang
+
+    def ocr_image(self, image, language=None, budget=None, pixels=None, trace=None):
+        """OCR adaptatif : le prétraitement est choisi d'après les statistiques de l'image,
+        la seconde passe n'a lieu que si Tesseract lui-même doute (confiance des mots).
+        `language` (DocumentLanguage) partage la langue détectée entre les pages d'un document.
+        `budget` (DocumentBudget) : la seconde passe est sautée si elle ne tient plus dans le budget.
+        `pixels` : tableau numpy dont `image` est une vue ; le prétraitement le lit directement
+        tant que le redressement n'a pas produit une nouvelle image.
+        `trace` (dict) reçoit les décisions de prétraitement et les temps, pour le debug."""
+        from .image_analysis import analyze_image, choose_preprocessing
+
+        # Redressement d'abord : une page tournée ferait échouer la première passe
+        deskewed = False
+        if self.deskew:
+            straightened = self.deskew_image(image)
+            if straightened is not image:
+                image, pixels, deskewed = straightened, None, True
+        source = image if pixels is None else pixels
         try:
-            # --- TENTATIVE 1 : PDF (TEXTE DIRECT) ---
+            with ocr_metrics.timer("ocr.analyze"):
+                stats = analyze_image(image)
+            method = choose_preprocessing(stats)
+        except Exception as e:
+            logging.warning(f"Analyse image échouée : {e}")
+            stats, method = {}, 'soft'
+        ocr_metrics.incr("ocr.pages")
+        ocr_metrics.incr(f"ocr.mode.{method}")
+        logging.debug(f"Prétraitement choisi : {method} {stats}")
+
+        lang = None
+        if self.lang_detect:
+            language = language or DocumentLanguage()
+            try:
+                lang = language.resolve(lambda: self.probe_language(image))
+            except Exception as e:
+                logging.warning(f"Détection de langue échouée : {e}")
+        ocr_metrics.incr(f"ocr.lang.{lang or 'combined'}")
+        trace = {} if trace is None else trace
+        trace.update({"stats": stats, "method": method, "lang": lang or self.languages, "deskewed": deskewed})
+
+        start = time.perf_counter()
+        text, confidence = self._tesseract_regions(self.enhance_image(source, method=method), lang)
+        trace.update({"confidence": round(confidence, 1), "chars": len(text.strip()),
+                      "first_pass_s": round(time.perf_counter() - start, 3)})
+        if confidence >= self.min_confidence:
+            return text
+        if budget is not None and budget.remaining() < time.perf_counter() - start:
+            ocr_metrics.incr("ocr.second_pass_skipped")
+            trace["second_pass"] = "skipped (budget)"
+            return text
+
+        # --- SECONDE PASSE : l'autre prétraitement ---
+        other = 'hard' if method == 'soft' else 'soft'
+        logging.info(f"OCR {method} peu fiable (confiance {confidence:.0f}), tentative mode {other}...")
+        ocr_metrics.incr("ocr.second_pass")
+        start = time.perf_counter()
+        text_2, confidence_2 = self._tesseract_regions(self.enhance_image(source, method=other), lang)
+        trace["second_pass"] = {"method": other, "confidence": round(confidence_2, 1),
+                                "chars": len(text_2.strip()), "seconds": round(time.perf_counter() - start, 3)}
+        # On garde la seconde passe si elle est plus sûre, ou si la première n'a rien lu
+        if text_2.strip() and (confidence_2 > confidence or not text.strip()):
+            ocr_metrics.incr("ocr.second_pass_won")
+            return text_2
+        return text
+
+    def ocr_array(self, pixels, lang=None):
+        """OCR d'une page reçue sous forme de tableau (mémoire partagée, langue déjà résolue par
+        l'appelant). L'image PIL partage les pixels du tableau : aucune copie avant le prétraitement."""
+        return self.ocr_image(Image.fromarray(pixels), DocumentLanguage(lang, resolved=True), pixels=pixels)
+
+    def ocr_page(self, image, language=None, budget=None):
+        """OCR d'une page rasterisée (pipeline PDF)."""
+        return self.ocr_image(image, language, budget)
+
+    def iter_pdf_windows(self, page_numbers):
+        """Regroupe les pages (numérotées à partir de 1) en fenêtres contiguës (first_page, last_page)."""
+        first = last = None
+        for page in page_numbers:
+            if first is not None and page == last + 1 and page - first < self.pdf_page_window:
+                last = page
+                continue
+            if first is not None:
+                yield first, last
+            first = last = page
+        if first is not None:
+            yield first, last
+
+    def _ocr_pdf_window(self, pdf_path, first, last, language, budget=None):
+        from pdf2image import convert_from_path
+        start = time.perf_counter()
+        # Rasterisation de la fenêtre seule, directement en niveaux de gris (3x moins de RAM)
+        images = convert_from_path(pdf_path, dpi=self.pdf_dpi, first_page=first, last_page=last, grayscale=True)
+        texts = []
+        if self.page_executor is not None and images:
+            # Langue résolue ici une fois, puis pages envoyées aux workers par descripteur
+            lang = language.resolve(lambda: self.probe_language(images[0])) if self.lang_detect else None
+            texts = list(self.page_executor.map_pages(images, lang=lang, level=self.ladder_level))
+            images.clear()
+        while images:
+            # On libère chaque page dès qu'elle est OCRisée
+            texts.append(self.ocr_page(images.pop(0), language, budget))
+        if budget is not None:
+            budget.record(time.perf_counter() - start, pages=last - first + 1)
+        return texts
+
+    def ocr_pdf_pages(self, file_bytes, pages=None, lang=None, budget=None):
+        """OCR d'un PDF scanné en flux : seules `pdf_page_workers` fenêtres de pages
+        sont en mémoire à un instant donné, quel que soit le nombre de pages.
+        `pages` restreint l'OCR à certaines pages (numéros à partir de 1).
+        `lang` force la langue (sinon détectée une fois, sur la première page OCRisée).
+        `budget` (DocumentBudget) choisit le palier de dégradation de chaque fenêtre et peut
+        abandonner les dernières pages : la liste retournée est alors plus courte que `pages`.
+        Retourne la liste des textes par page OCRisée, dans l'ordre."""
+        from pdf2image import pdfinfo_from_path
+
+        language = DocumentLanguage(lang)
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+            # Un seul fichier temporaire partagé par toutes les fenêtres (pas de copie par page)
+            tmp.write(file_bytes)
+            tmp.flush()
+            if pages is None:
+                page_count = int(pdfinfo_from_path(tmp.name)["Pages"])
+                pages = range(1, min(page_count, self.max_pages or page_count) + 1)
+            logging.debug(f"PDF scanné : {len(pages)} pages à OCRiser, {self.pdf_page_workers} en parallèle")
+
+            windows = ((last - first + 1,
+                        lambda engine, first=first, last=last: engine._ocr_pdf_window(tmp.name, first, last, language, budget))
+                       for first, last in self.iter_pdf_windows(pages))
+            return self._stream_pages(windows, len(pages), budget)
+
+    def _stream_pages(self, batches, total, budget=None):
+        """Exécute des lots de pages `(nombre_de_pages, run)` sur `pdf_page_workers` threads, en flux :
+        le lot suivant n'est produit (rasterisé, décodé...) que lorsqu'une place se libère.
+        `run(engine)` reçoit le moteur du palier choisi par le budget et retourne une liste de
+        résultats par page. Retourne la concaténation des résultats, dans l'ordre ; plus courte que
+        `total` si le budget a fait abandonner les derniers lots."""
+        results = []
+        started = 0
+        with ThreadPoolExecutor(max_workers=self.pdf_page_workers) as pool:
+            pending = []
+            for count, run in batches:
+                level = 0
+                if budget is not None:
+                    level = budget.plan(pages_left=total - started, pages_started=started,
+                                        parallel=self.pdf_page_workers)
+                    if level is None:
+                        ocr_metrics.incr("ocr.budget.pages_dropped", total - started)
+                        break
+                pending.append(pool.submit(run, self.degraded(level)))
+                started += count
+                # Fenêtre bornée : on attend le plus ancien lot avant d'en lancer d'autres
+                if len(pending) >= self.pdf_page_workers:
+                    results.extend(pending.pop(0).result())
+            for future in pending:
+                results.extend(future.result())
+        return results
+
+    @staticmethod
+    def flatten_image(image):
+        """Image à un seul calque, sur fond blanc si elle est transparente.
+        Les images déjà en niveaux de gris (fax, scans N&B) le restent : 3x moins de mémoire qu'en RGB."""
+        # Conversion cruciale pour les PNG transparents (ex: remove-bg)
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            if image.mode != 'RGBA':
+                image = image.convert('RGBA')
+            background.paste(image, mask=image.split()[3]) # 3 is the alpha channel
+            return background
+        if image.mode in ('1', 'L'):
+            return image.convert('L')
+        return image.convert('RGB')
+
+    def _ocr_frame(self, frame, language, budget):
+        start = time.perf_counter()
+        text = self.ocr_page(frame, language, budget)
+        if budget is not None:
+            budget.record(time.perf_counter() - start)
+        return text
+
+    def ocr_frames(self, image, budget=None):
+        """Pages d'une image multi-pages (TIFF de fax, GIF) : même pipeline en flux que les pages
+        PDF, chaque page n'étant décodée qu'au moment où un thread peut la prendre.
+        Retourne la liste des textes par page, dans l'ordre."""
+        language = DocumentLanguage()
+        total = min(image.n_frames, self.max_pages or image.n_frames)
+        logging.debug(f"Image multi-pages : {total} pages à OCRiser")
+
+        def frames():
+            for index in range(total):
+                image.seek(index)
+                frame = self.flatten_image(image)  # copie indépendante du cadre courant
+                yield 1, lambda engine, frame=frame: [engine._ocr_frame(frame, language, budget)]
+
+        return self._stream_pages(frames(), total, budget)
+
+    def needs_tiling(self, image):
+        return bool(self.tile_min_megapixels) and image.width * image.height > self.tile_min_megapixels * 1e6
+
+    def _ocr_tile(self, gray, box, core, language, budget):
+        """Mots d'une tuile en coordonnées de l'image entière ; seuls ceux dont le centre tombe
+        dans le coeur de la tuile sont gardés (les recouvrements ne sont pas lus deux fois)."""
+        from .image_analysis import analyze_image, choose_preprocessing, has_ink
+
+        start = time.perf_counter()
+        tile = gray.crop(box)
+        words = []
+        if not has_ink(tile):
+            ocr_metrics.incr("ocr.tiles.blank")
+        else:
+            ocr_metrics.incr("ocr.tiles")
+            try:
+                method = choose_preprocessing(analyze_image(tile))
+            except Exception as e:
+                logging.warning(f"Analyse de tuile échouée : {e}")
+                method = 'soft'
+            lang = language.resolve(lambda: self.probe_language(tile)) if self.lang_detect else None
+            enhanced = self.enhance_image(tile, method=method)
+            scale = enhanced.width / tile.width
+            with ocr_metrics.timer("ocr.tesseract"):
+                data = self.backend.image_to_data(enhanced, lang or self.languages)
+            for i, text in enumerate(data["text"]):
+                if float(data["conf"][i]) < 0 or not text.strip():
+                    continue
+                left, top = box[0] + data["left"][i] / scale, box[1] + data["top"][i] / scale
+                width, height = data["width"][i] / scale, data["height"][i] / scale
+                if core[0] <= left + width / 2 < core[2] and core[1] <= top + height / 2 < core[3]:
+                    words.append((left, top, width, height, text))
+        if budget is not None:
+            budget.record(time.perf_counter() - start)
+        return words
+
+    def ocr_tiled(self, image, budget=None):
+        """OCR d'une très grande image (plans, affiches) par tuiles qui se recouvrent, en parallèle,
+        sans réduire la résolution : seules `pdf_page_workers` tuiles sont prétraitées à la fois.
+        Les mots sont recollés par leurs positions ; les tuiles blanches sont sautées."""
+        from .image_analysis import tile_boxes, stitch_words
+
+        gray = image if image.mode == 'L' else image.convert('L')
+        if self.deskew:
+            gray = self.deskew_image(gray)
+        tiles = tile_boxes(gray.size, self.tile_size, self.tile_overlap)
+        logging.info(f"Image {gray.width}x{gray.height} découpée en {len(tiles)} tuiles")
+        language = DocumentLanguage()
+        batches = ((1, lambda engine, box=box, core=core: [engine._ocr_tile(gray, box, core, language, budget)])
+                   for box, core in tiles)
+        words = [word for tile_words in self._stream_pages(batches, len(tiles), budget) for word in tile_words]
+        return stitch_words(words)
+
+    def has_text_layer(self, text):
+        """Une couche texte est exploitable si elle est assez longue et pas faite de glyphes parasites
+        (polices mal encodées, filigranes)."""
+        chars = [c for c in (text or "") if not c.isspace()]
+        if len(chars) < self.pdf_text_min_chars:
+            return False
+        return sum(c.isalnum() for c in chars) / len(chars) >= self.pdf_text_min_alnum
+
+    def _text_enough(self, pages, chars):
+        return bool((self.text_enough_chars and chars >= self.text_enough_chars)
+                    or (self.text_enough_pages and pages >= self.text_enough_pages))
+
+    @staticmethod
+    def _page_has_images(page):
+        """Vrai si la page dessine des images (ou des formulaires pouvant en contenir)."""
+        try:
+            resources = page.get("/Resources")
+            xobjects = resources.get_object().get("/XObject") if resources else None
+            if not xobjects:
+                return False
+            xobjects = xobjects.get_object()
+            return any(xobjects[name].get_object().get("/Subtype") in ("/Image", "/Form") for name in xobjects)
+        except Exception:
+            # Dans le doute, la page reste candidate à l'OCR
+            return True
+
+    @classmethod
+    def read_pdf_text_page(cls, page):
+        """(texte natif, contient_des_images) d'une page pypdf."""
+        return page.extract_text() or "", cls._page_has_images(page)
+
+    def extract_pdf_text_pages(self, file_bytes):
+        """Texte natif (pypdf) page par page sous forme de (texte, contient_des_images), plus le
+        nombre total de pages ; None si le PDF est illisible par pypdf.
+        La lecture s'arrête dès que le texte suffit (mode « assez pour classer ») : la liste
+        retournée couvre alors seulement les premières pages. Les gros documents sont lus par
+        tranches de pages en parallèle quand un exécuteur de pages est disponible."""
+        try:
+            from pypdf import PdfReader
+            reader = PdfReader(io.BytesIO(file_bytes))
+            total = len(reader.pages)
+            if self.page_executor is not None and total >= self.pdf_text_parallel_min_pages:
+                step = self.pdf_text_chunk_pages
+                chunks = self.page_executor.map_pdf_text(
+                    file_bytes, [(first, min(first + step, total)) for first in range(0, total, step)])
+                ocr_metrics.incr("ocr.pdf_text.parallel")
+            else:
+                chunks = ([self.read_pdf_text_page(page)] for page in reader.pages)
+
+            pages, chars = [], 0
+            try:
+                for chunk in chunks:
+                    for page in chunk:
+                        pages.append(page)
+                        chars += len(page[0].strip())
+                        if self._text_enough(len(pages), chars):
+                            break
+                    if self._text_enough(len(pages), chars):
+                        break
+            finally:
+                # Arrêt anticipé : les tranches encore en vol sont annulées
+                chunks.close()
+            if len(pages) < total:
+                ocr_metrics.incr("ocr.pdf_text.early_stop")
+            return pages, total
+        except Exception as e_pypdf:
+            logging.debug(f"Pypdf failed: {e_pypdf}")
+            return None
+
+    def _extract_pdf_hybrid(self, file_bytes, pages, total, budget):
+        """Routage par page : texte natif là où il existe, OCR des pages sans couche texte exploitable.
+        Une page sans couche texte est toujours OCRisée, même sans XObject image : images en ligne
+        (BI…ID…EI) ou texte vectorisé n'en déclarent pas. Seule une page qui a déjà un peu de texte
+        natif et ne dessine aucune image le garde tel quel : l'OCR n'y trouverait rien de plus.
+        `pages` peut ne couvrir que le début des `total` pages (arrêt anticipé)."""
+        page_texts = [text for text, _ in pages]
+        skipped = 0
+        missing = [i + 1 for i, (text, has_images) in enumerate(pages)
+                   if not self.has_text_layer(text) and (has_images or not text.strip())]
+        early_stop = len(pages) < total
+        if self.max_pages is not None and len(missing) > self.max_pages:
+            missing, early_stop = missing[:self.max_pages], True
+        if missing:
+            logging.info(f"PDF hybride : {len(pages) - len(missing)} pages texte, {len(missing)} pages à OCRiser")
+            # La couche texte native donne la langue gratuitement (sinon détection sur la 1re page OCRisée)
+            lang = detect_language("\n".join(page_texts), languages=self.languages.split("+")) if self.lang_detect else None
+            try:
+                ocr_texts = self.ocr_pdf_pages(file_bytes, pages=missing, lang=lang, budget=budget)
+                skipped = len(missing) - len(ocr_texts)
+                for page_no, text in zip(missing, ocr_texts):
+                    # On garde la couche native (même pauvre) si l'OCR ne trouve rien de mieux
+                    if text and len(text.strip()) > len(page_texts[page_no - 1].strip()):
+                        page_texts[page_no - 1] = text
+            except Exception as e_pdf:
+                if len(missing) == len(pages):
+                    return OCRResult.failure("pdf_unreadable", f"Erreur OCR PDF (Poppler) : {str(e_pdf)}")
+                logging.warning(f"OCR des pages scannées impossible, texte natif conservé : {e_pdf}")
+
+        result = "\n".join(text.strip() for text in page_texts if text.strip())
+        if result:
+            return OCRResult(result, pages_done=len(pages) - skipped, pages_total=total, early_stop=early_stop)
+        return OCRResult.failure("empty", "PDF détecté mais illisible par OCR.")
+
+    def extract(self, file_bytes, filename="", budget=None):
+        """Extraction ultra-robuste avec pypdf (Texte par page) + OCR des pages scannées,
+        sous le budget de temps du document. Retourne un OCRResult."""
+        budget = budget or self.new_budget()
+        result = self._extract(file_bytes, filename, budget)
+        result.level = max(result.level, budget.level)
+        result.partial = result.partial or budget.partial
+        result.decisions = budget.decisions + result.decisions
+        result.elapsed = budget.elapsed()
+        if result.degraded:
+            ocr_metrics.incr(f"ocr.budget.{result.ladder}")
+            logging.warning(f"OCR dégradé pour {filename or 'document'} ({result.ladder}, "
+                            f"partiel={result.partial}) : {'; '.join(result.decisions)}")
+        return result
+
+    def _extract(self, file_bytes, filename, budget):
+        try:
+            # --- TENTATIVE 1 : PDF HYBRIDE (TEXTE NATIF PAR PAGE + OCR DES PAGES SCANNÉES) ---
             is_pdf = file_bytes.startswith(b'%PDF') or (filename and filename.lower().endswith('.pdf'))
             if is_pdf:
-                try:
-                    from pypdf import PdfReader
-                    reader = PdfReader(io.BytesIO(file_bytes))
-                    text_content = ""
-                    for page in reader.pages:
-                        extracted = page.extract_text()
-                        if extracted:
-                            text_content += extracted + "\n"
-                    
-                    if len(text_content.strip()) > 30: # Seuil relevé pour assurer une qualité minimum
-                        return text_content.strip(), None
-                    logging.debug("PDF texte vide ou scanné, passage à l'OCR...")
-                except Exception as e_pypdf:
-                    logging.debug(f"Pypdf failed: {e_pypdf}")
+                native = self.extract_pdf_text_pages(file_bytes)
+                if native is not None:
+                    return self._extract_pdf_hybrid(file_bytes, *native, budget)
 
             # --- TENTATIVE 2 : IMAGE (PIL) ---
             try:
-                img_io = io.BytesIO(file_bytes)
-                image = Image.open(img_io)
-                
-                # Conversion cruciale pour les PNG transparents (ex: remove-bg)
-                if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
-                    background = Image.new("RGB", image.size, (255, 255, 255))
-                    if image.mode == 'P':
-                        image = image.convert('RGBA')
-                    background.paste(image, mask=image.split()[3]) # 3 is the alpha channel
-                    image = background
-                elif image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # --- NOUVEAU: Correction de rotation ---
-                # DISABLED: Deskew is causing -90 degree rotation on upright documents
-                # image = self.deskew_image(image)
-                
-                # --- TENTATIVE A: Mode Soft (Grayscale) ---
-                # Idéal pour les documents nés numériques ou avec fond coloré
-                img_soft = self.enhance_image(image, method='soft')
-                text = pytesseract.image_to_string(img_soft, lang='fra+eng')
+                image = self.open_image(file_bytes)
+
+                # --- IMAGE MULTI-PAGES (TIFF de fax, GIF) : une page par cadre ---
+                if image.format in ('TIFF', 'GIF') and getattr(image, 'n_frames', 1) > 1:
+                    texts = self.ocr_frames(image, budget)
+                    text = "\n".join(t.strip() for t in texts if t.strip())
+                    if text:
+                        return OCRResult(text, pages_done=len(texts), pages_total=image.n_frames,
+                                         early_stop=len(texts) < image.n_frames and not budget.partial)
+                    return OCRResult.failure("empty", f"Image multi-pages illisible par OCR : {filename}")
+
+                image = self.flatten_image(image)
+
+                # --- TRÈS GRANDE IMAGE : TUILES ---
+                if self.needs_tiling(image):
+                    text = self.ocr_tiled(image, budget)
+                    if text.strip():
+                        return OCRResult(text.strip(), pages_done=1, pages_total=1)
+                    return OCRResult.failure("empty", f"Grande image illisible par OCR : {filename}")
                 
-                # --- TENTATIVE B: Mode Hard (Threshold) ---
-                # Si le mode Soft échoue (texte vide ou trop court), on tente le mode Hard
-                # Idéal pour les scans papiers, tickets de caisse, faible contraste
-                if not text or len(text.strip()) < 10:
-                    logging.info("OCR Soft insuffisant, tentative mode Hard...")
-                    img_hard = self.enhance_image(image, method='hard')
-                    text_hard = pytesseract.image_to_string(img_hard, lang='fra+eng')
-                    
-                    # On garde le Hard seulement s'il a trouvé quelque chose
-                    if text_hard and len(text_hard.strip()) > len(text.strip()):
-                        text = text_hard
+                # --- OCR ADAPTATIF (soft/hard choisi d'après l'image, seconde passe si confiance basse) ---
+                level = budget.plan()
+                if level is None:
+                    return OCRResult.failure("timeout", f"Budget OCR épuisé avant l'OCR de l'image : {filename}")
+                start = time.perf_counter()
+                trace = {}
+                text = self.degraded(level).ocr_image(image, budget=budget, trace=trace)
+                budget.record(time.perf_counter() - start)
 
                 if text and len(text.strip()) >= 2:
-                    return text.strip(), None
+                    return OCRResult(text.strip(), pages_done=1, pages_total=1)
                 
-                # --- DEBUG : SAUVEGARDE IMAGE ECHEC ---
-                debug_filename = f"uploads/debug_ocr_fail_{os.path.basename(filename) if filename else 'unknown'}.png"
-                logging.warning(f"Image OCR vide. Sauvegarde debug : {debug_filename}")
-                image.save(debug_filename)
-                
-                logging.debug("Image OCR vide ou trop courte.")
+                # --- DEBUG : ÉCHEC ÉCHANTILLONNÉ, ÉCRIT EN ARRIÈRE-PLAN ---
+                logging.warning(f"Image OCR vide ou trop courte : {filename or 'unknown'}")
+                debug_artifacts.submit(image, filename, {
+                    "pipeline": OCR_PIPELINE_VERSION,
+                    "config_version": self.config_version(),
+                    "ocr_s": round(time.perf_counter() - start, 3),
+                    "elapsed_s": round(budget.elapsed(), 3),
+                    "ladder_level": level,
+                    "budget_decisions": budget.decisions,
+                    "ocr": trace,
+                })
             except Exception as e_img:
                 logging.error(f"Tentative Image échouée : {str(e_img)}")
 
-            # --- TENTATIVE 3 : PDF (OCR COMPLET) ---
+            # --- TENTATIVE 3 : PDF (OCR COMPLET, si pypdf n'a pas pu lire le document) ---
             if is_pdf:
                 try:
-                    from pdf2image import convert_from_bytes
-                    # DPI 300 pour une précision maximale au détriment de la vitesse
-                    images = convert_from_bytes(file_bytes, dpi=300)
-                    if images:
-                        texts = []
-                        for img in images:
-                            # --- NOUVEAU: Correction de rotation par page ---
-                            # DISABLED: Deskew is causing -90 degree rotation
-                            # img = self.deskew_image(img)
-                            img = self.enhance_image(img)
-                            texts.append(pytesseract.image_to_string(img, lang='fra+eng'))
-                        result = "\n".join(texts).strip()
-                        if result:
-                            return result, None
-                        else:
-                            return "", "[V5] PDF détecté mais illisible par OCR."
+                    from pdf2image import pdfinfo_from_bytes
+                    # Nombre de pages connu : un profil limité (max_pages) donne un résultat partiel
+                    total = int(pdfinfo_from_bytes(file_bytes)["Pages"])
+                    pages = range(1, min(total, self.max_pages or total) + 1)
+                    texts = self.ocr_pdf_pages(file_bytes, pages=pages, budget=budget)
+                    result = "\n".join(texts).strip()
+                    if result:
+                        return OCRResult(result, pages_done=len(texts), pages_total=total,
+                                         early_stop=len(texts) < total and not budget.partial)
+                    else:
+                        return OCRResult.failure("empty", "PDF détecté mais illisible par OCR.")
                 except Exception as e_pdf:
-                    return "", f"[V5] Erreur OCR PDF (Poppler) : {str(e_pdf)}"
+                    return OCRResult.failure("pdf_unreadable", f"Erreur OCR PDF (Poppler) : {str(e_pdf)}")
 
-            return "", f"[V5] Format non reconnu ou texte manquant. (Source: {filename})"
+            return OCRResult.failure("unsupported", f"Format non reconnu ou texte manquant. (Source: {filename})")
 
         except Exception as e_final:
-            return "", f"[V5] Erreur Critique OCR : {str(e_final)}"
+            return OCRResult.failure("internal", f"Erreur Critique OCR : {str(e_final)}")
+
+    def extract_from_bytes(self, file_bytes, filename=""):
+        """Compatibilité : (text, error) au lieu d'un OCRResult."""
+        result = self.extract(file_bytes, filename=filename)
+        return result.text, result.error
 
 ocr_service = OCREngine()
+fast_ocr_service = ocr_service.fast_variant()
@@ -0,0 +1,129 @@
+import logging
+import threading
+
+# Clés du dictionnaire retourné par image_to_data (format pytesseract.Output.DICT)
+DATA_KEYS = ("text", "conf", "block_num", "par_num", "line_num", "left", "top", "width", "height")
+
+
+class PytesseractBackend:
+    """Backend historique : un processus `tesseract` et des fichiers temporaires par appel."""
+
+    name = "pytesseract"
+
+    def __init__(self):
+        import pytesseract
+        self._pytesseract = pytesseract
+
+    def version(self):
+        return str(self._pytesseract.get_tesseract_version())
+
+    def warmup(self, languages):
+        # Rien à précharger : chaque appel relance le binaire
+        self.version()
+
+    def image_to_string(self, image, lang):
+        return self._pytesseract.image_to_string(image, lang=lang)
+
+    def image_to_data(self, image, lang):
+        data = self._pytesseract.image_to_data(image, lang=lang, output_type=self._pytesseract.Output.DICT)
+        return {key: data[key] for key in DATA_KEYS}
+
+
+class TesserocrBackend:
+    """Backend en processus via l'API C++ de Tesseract (tesserocr).
+
+    Les handles `PyTessBaseAPI` (traineddata chargé une fois) sont gardés en vie pour toute la
+    durée du worker et réutilisés d'un appel à l'autre ; les images passent en mémoire, sans
+    fichier temporaire. Un handle n'est pas thread-safe : chaque appel en emprunte un libre
+    (un par thread de page actif au plus).
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def version(self):
+        return self._tesserocr.tesseract_version().splitlines()[0]
+
+    def _acquire(self, lang):
+        with self._lock:
+            handles = self._idle.setdefault(lang, [])
+            if handles:
+                return handles.pop()
+        logging.debug(f"tesserocr : nouveau handle pour '{lang}'")
+        return self._tesserocr.PyTessBaseAPI(lang=lang, psm=self._tesserocr.PSM.AUTO)
+
+    def _release(self, lang, api):
+        api.Clear()
+        with self._lock:
+            self._idle.setdefault(lang, []).append(api)
+
+    def warmup(self, languages):
+        self._release(languages, self._acquire(languages))
+
+    def image_to_string(self, image, lang):
+        api = self._acquire(lang)
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            self._release(lang, api)
+
+    def image_to_data(self, image, lang):
+        RIL = self._tesserocr.RIL
+        data = {key: [] for key in DATA_KEYS}
+        api = self._acquire(lang)
+        try:
+            api.SetImage(image)
+            api.Recognize()
+            iterator = api.GetIterator()
+            if iterator is None:
+                return data
+            block = par = line = 0
+            for word in self._tesserocr.iterate_level(iterator, RIL.WORD):
+                if word.IsAtBeginningOf(RIL.BLOCK):
+                    block, par, line = block + 1, 0, 0
+                if word.IsAtBeginningOf(RIL.PARA):
+                    par, line = par + 1, 0
+                if word.IsAtBeginningOf(RIL.TEXTLINE):
+                    line += 1
+                text = word.GetUTF8Text(RIL.WORD)
+                box = word.BoundingBox(RIL.WORD)
+                if text is None or box is None:
+                    continue
+                x1, y1, x2, y2 = box
+                for key, value in zip(DATA_KEYS, (text, word.Confidence(RIL.WORD), block, par, line,
+                                                  x1, y1, x2 - x1, y2 - y1)):
+                    data[key].append(value)
+            return data
+        finally:
+            self._release(lang, api)
+
+
+BACKENDS = {"tesserocr": TesserocrBackend, "pytesseract": PytesseractBackend}
+
+
+def get_ocr_backend(name="auto"):
+    """Instancie le backend demandé. 'auto' : tesserocr s'il est installé, sinon pytesseract.
+    Le choix de 'auto' est journalisé : pytesseract lance un processus tesseract à chaque appel
+    (tesserocr s'installe avec requirements-ocr.txt)."""
+    if name == "auto":
+        try:
+            backend = TesserocrBackend()
+            logging.info("Backend OCR (auto) : tesserocr, handles persistants")
+        except ImportError as e:
+            backend = PytesseractBackend()
+            logging.info(f"Backend OCR (auto) : pytesseract, un processus par appel (tesserocr absent : {e}) ; "
+                         f"installer requirements-ocr.txt pour les handles persistants")
+        return backend
+    if name not in BACKENDS:
+        raise ValueError(f"Backend OCR inconnu : {name} (choix : {', '.join(BACKENDS)}, auto)")
+    try:
+        return BACKENDS[name]()
+    except ImportError as e:
+        logging.warning(f"Backend OCR '{name}' indisponible ({e}), repli sur pytesseract")
+        return PytesseractBackend()
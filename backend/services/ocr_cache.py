@@ -0,0 +1,187 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+
+class OCRCache:
+    """Cache des résultats OCR adressé par contenu.
+
+    Clé = SHA-256 des octets du fichier + version de configuration OCR.
+    - Tier mémoire : LRU de `memory_items` entrées.
+    - Tier disque : un fichier texte par entrée sous `<cache_dir>/<config_version>/`,
+      plafonné à `disk_max_bytes` (éviction des entrées les moins récemment lues).
+    Un changement de réglages de prétraitement change la version : les anciennes
+    entrées ne sont plus jamais servies. Le dossier d'une version est purgé au démarrage
+    seulement s'il n'a servi à personne depuis `stale_seconds` : des processus aux réglages
+    différents (API, entraînement) partagent le même dossier sans effacer le cache des autres.
+    `purge_stale=False` (workers OCR) : aucune purge.
+    """
+
+    def __init__(self, config_version, cache_dir=None, memory_items=256, disk_max_bytes=200 * 1024 * 1024,
+                 stale_seconds=7 * 24 * 3600, purge_stale=True):
+        self.config_version = config_version
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self.cache_dir = os.path.join(cache_dir, config_version) if cache_dir else None
+
+        self._memory = OrderedDict()
+        self._disk_index = OrderedDict()  # clé -> taille, du moins au plus récemment utilisé
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        if self.cache_dir:
+            self._load_disk_index(cache_dir, stale_seconds if purge_stale else None)
+
+    @staticmethod
+    def _last_used(path):
+        """Dernière utilisation d'un dossier de version : mtime le plus récent du dossier et de ses
+        entrées (une lecture touche l'entrée lue, une écriture modifie le dossier)."""
+        with os.scandir(path) as entries:
+            return max([os.stat(path).st_mtime] + [entry.stat().st_mtime for entry in entries])
+
+    def _load_disk_index(self, root, stale_seconds):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            os.utime(self.cache_dir)  # version en service : jamais purgée par un autre processus
+            # Invalidation : purge des seules versions inutilisées depuis stale_seconds
+            if stale_seconds is not None:
+                limit = time.time() - stale_seconds
+                for name in os.listdir(root):
+                    path = os.path.join(root, name)
+                    if name == self.config_version or not os.path.isdir(path):
+                        continue
+                    try:
+                        stale = self._last_used(path) < limit
+                    except OSError:
+                        continue  # dossier modifié par un autre processus pendant le parcours
+                    if stale:
+                        logging.info(f"Cache OCR : purge de la version inutilisée {name}")
+                        shutil.rmtree(path, ignore_errors=True)
+
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".txt"):
+                    continue
+                st = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+            for _, key, size in sorted(entries):
+                self._disk_index[key] = size
+                self._disk_bytes += size
+        except OSError as e:
+            logging.warning(f"Cache OCR disque désactivé : {e}")
+            self.cache_dir = None
+
+    def make_key(self, file_bytes, variant=""):
+        """`variant` distingue les profils d'extraction d'un même fichier (ex. passe rapide)."""
+        digest = hashlib.sha256(file_bytes).hexdigest()
+        return hashlib.sha256(f"{self.config_version}:{variant}:{digest}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def _remember(self, key, text):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Retourne le texte en cache ou None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self._memory[key]
+
+            if self.cache_dir and key in self._disk_index:
+                try:
+                    path = self._path(key)
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                    os.utime(path)  # LRU disque basé sur le mtime
+                    self._disk_index.move_to_end(key)
+                    self._remember(key, text)
+                    self.counters["disk_hits"] += 1
+                    return text
+                except OSError:
+                    self._disk_bytes -= self._disk_index.pop(key, 0)
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key, text):
+        with self._lock:
+            self._remember(key, text)
+            if not self.cache_dir:
+                return
+            try:
+                path = self._path(key)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, path)  # écriture atomique
+                size = os.path.getsize(path)
+                self._disk_bytes += size - self._disk_index.pop(key, 0)
+                self._disk_index[key] = size
+                self.counters["writes"] += 1
+                self._evict()
+            except OSError as e:
+                logging.warning(f"Cache OCR : écriture impossible ({e})")
+
+    def _evict(self):
+        while self._disk_bytes > self.disk_max_bytes and self._disk_index:
+            key, size = self._disk_index.popitem(last=False)
+            self._disk_bytes -= size
+            self.counters["evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.cache_dir:
+                for key in list(self._disk_index):
+                    try:
+                        os.remove(self._path(key))
+                    except OSError:
+                        pass
+            self._disk_index.clear()
+            self._disk_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk_index),
+                "disk_bytes": self._disk_bytes,
+                "config_version": self.config_version,
+            }
+
+
+def build_ocr_cache(engine):
+    """Construit le cache à partir de l'environnement (OCR_CACHE_*) et des réglages du moteur.
+    Seul le processus principal purge les versions inutilisées : les workers OCR (qui importent
+    aussi l'exécuteur) ne touchent pas au dossier."""
+    import multiprocessing
+
+    if os.getenv("OCR_CACHE_ENABLED", "1") == "0":
+        return None
+    return OCRCache(
+        config_version=engine.config_version(),
+        cache_dir=os.getenv("OCR_CACHE_DIR", "uploads/.ocr_cache") or None,
+        memory_items=int(os.getenv("OCR_CACHE_MEMORY_ITEMS", "256")),
+        disk_max_bytes=int(float(os.getenv("OCR_CACHE_MAX_MB", "200")) * 1024 * 1024),
+        stale_seconds=float(os.getenv("OCR_CACHE_STALE_DAYS", "7")) * 24 * 3600,
+        purge_stale=multiprocessing.parent_process() is None
+    )
@@ -0,0 +1,375 @@
+import io
+import os
+import copy
+import asyncio
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from .ocr_cache import build_ocr_cache
+from .metrics import ocr_metrics
+from .ocr_result import OCRResult
+from .shared_pages import SharedPage, shared_pages
+
+
+def _init_worker():
+    """Initialisation d'un worker : Tesseract et OpenCV sont chargés une seule fois par processus."""
+    # Le parallélisme vient du pool : on évite que chaque worker sature tous les coeurs
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except Exception as e:
+        logging.warning(f"OCR worker : OpenCV indisponible ({e})")
+
+    # Import du moteur (et de son singleton) dans le worker, puis préchargement du backend :
+    # avec tesserocr, le traineddata est chargé ici une fois pour toute la vie du worker
+    from .ocr import ocr_service
+    try:
+        ocr_service.backend.warmup(ocr_service.languages)
+        logging.info(f"OCR worker prêt ({ocr_service.backend.name} {ocr_service.backend.version()})")
+    except Exception as e:
+        logging.warning(f"OCR worker : Tesseract indisponible ({e})")
+
+
+def _run_extraction(file_bytes, filename, profile="full"):
+    """Job exécuté dans un worker : OCRResult de OCREngine.extract, plus les métriques
+    produites par le job pour le processus principal.
+    profile='fast' : passe rapide de la cascade (1re page, basse résolution)."""
+    from .ocr import ocr_service, fast_ocr_service
+    engine = fast_ocr_service if profile == "fast" else ocr_service
+    return engine.extract(file_bytes, filename=filename), ocr_metrics.drain()
+
+
+def _run_page(page, lang=None, level=0):
+    """Job page : OCR d'une page reçue en mémoire partagée (SharedPage), au palier `level`."""
+    from .ocr import ocr_service
+    try:
+        with page.attach() as pixels:
+            text = ocr_service.degraded(level).ocr_array(pixels, lang)
+            del pixels  # la vue doit être relâchée avant la fermeture du segment
+    except Exception as e:
+        # Certaines exceptions (ex. pytesseract) ne se dépicklent pas et casseraient le pool
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return text, ocr_metrics.drain()
+
+
+def _run_pdf_text(document, first, last):
+    """Job tranche : couche texte pypdf des pages [first, last) d'un PDF reçu en mémoire partagée."""
+    from pypdf import PdfReader
+    from .ocr import OCREngine
+    try:
+        with document.attach() as data:
+            reader = PdfReader(io.BytesIO(data.tobytes()))
+            del data
+        pages = [OCREngine.read_pdf_text_page(reader.pages[i]) for i in range(first, last)]
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return pages, ocr_metrics.drain()
+
+
+class OCRExecutor:
+    """Pool borné de processus OCR partagé par l'API et l'entraînement.
+
+    - OCR_WORKERS : nombre de processus (défaut : nombre de coeurs, 0 = exécution locale).
+    - OCR_JOB_TIMEOUT : délai max (secondes) d'un job avant abandon ; filet de sécurité au-delà
+      du budget par document (OCR_DOC_BUDGET), qui lui dégrade l'OCR au lieu de l'abandonner.
+      Un job déjà démarré ne s'annule pas : au délai dépassé, les workers du pool sont
+      terminés (recyclage) pour qu'un fichier pathologique ne garde pas un slot indéfiniment.
+      Les autres jobs de ce pool, interrompus sans faute de leur part, sont relancés une fois
+      sur le pool neuf.
+    - OCR_PAGE_FANOUT : 1 pour répartir les pages d'un PDF scanné sur tous les workers. Le PDF est
+      alors rasterisé dans ce processus et chaque page est transmise en mémoire partagée
+      (descripteur nom/forme/dtype, pixels jamais picklés).
+    Toutes les méthodes d'extraction retournent des OCRResult.
+    """
+
+    def __init__(self, max_workers=None, job_timeout=None):
+        if max_workers is None:
+            max_workers = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+        if job_timeout is None:
+            job_timeout = float(os.getenv("OCR_JOB_TIMEOUT", "120"))
+        self.max_workers = max(0, max_workers)
+        self.job_timeout = job_timeout
+        self.start_method = os.getenv("OCR_START_METHOD", "spawn")
+        self.page_fanout = os.getenv("OCR_PAGE_FANOUT", "0") == "1"
+        self._pool = None
+        self._lock = threading.Lock()
+        # Le cache vit dans le processus appelant : un hit ne coûte aucun aller-retour vers un worker
+        from .ocr import ocr_service, fast_ocr_service
+        self.cache = build_ocr_cache(ocr_service)
+        # Chaque profil a ses propres entrées ; le profil rapide suit aussi ses propres réglages
+        self._cache_variants = {"full": "", "fast": f"fast:{fast_ocr_service.config_version()}"}
+
+    def _get_pool(self):
+        # Création paresseuse : importer le module ne lance aucun processus
+        with self._lock:
+            if self._pool is None:
+                logging.info(f"Démarrage du pool OCR ({self.max_workers} workers)")
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker
+                )
+            return self._pool
+
+    def _reset_pool(self, broken=None):
+        """Abandonne un pool cassé (worker tué, OOM...) : un pool neuf sera créé au prochain job.
+        `broken` : pool d'un job échoué ; ignoré s'il a déjà été remplacé (ex. après un recyclage)."""
+        with self._lock:
+            if broken is not None and self._pool is not broken:
+                return
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _recycle_pool(self, pool, reason):
+        """Termine les workers de `pool` (job bloqué) : un pool neuf sera créé au prochain job.
+        Les autres jobs de ce pool, en cours ou en attente, échouent en BrokenProcessPool
+        (pas d'annulation) et sont relancés par `_retry`."""
+        if pool is None:
+            return
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        logging.warning(f"Recyclage du pool OCR : {reason}")
+        ocr_metrics.incr("ocr.pool_recycled")
+        pool.recycled = True
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        pool.shutdown(wait=False)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    def _retry(self, future):
+        """Relance une fois, sur un pool neuf, un job interrompu seulement parce que son pool a été
+        recyclé pour un autre job bloqué. Retourne le nouveau Future, ou None."""
+        pool = getattr(future, "pool", None)
+        if not getattr(pool, "recycled", False) or getattr(future, "retried", False):
+            return None
+        ocr_metrics.incr("ocr.pool_recycled.retried")
+        retry = self._submit(*future.job)
+        retry.retried = True
+        return retry
+
+    def _submit(self, fn, *args):
+        pool = self._get_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            logging.warning("Pool OCR cassé, redémarrage...")
+            self._reset_pool()
+            pool = self._get_pool()
+            future = pool.submit(fn, *args)
+        future.pool = pool  # pool à recycler si le job dépasse son délai
+        future.job = (fn, *args)  # pour le relancer si un autre job fait recycler ce pool
+        return future
+
+    def _timeout(self, future, filename, timeout):
+        """Délai dépassé : annule le job s'il attend encore, sinon recycle le pool qui l'exécute."""
+        if not future.cancel():
+            self._recycle_pool(getattr(future, "pool", None), f"{filename} bloqué au-delà de {timeout:.0f}s")
+        logging.warning(f"OCR timeout ({timeout}s) pour {filename}")
+        return OCRResult.failure("timeout", f"Délai OCR dépassé ({timeout:.0f}s) : {filename}")
+
+    def submit(self, file_bytes, filename="", profile="full"):
+        """Soumet un job d'extraction et retourne un Future de (OCRResult, métriques)."""
+        return self._submit(_run_extraction, file_bytes, filename, profile)
+
+    def map_pages(self, images, lang=None, level=0, timeout=None):
+        """OCR de pages rasterisées (PIL ou numpy) réparties sur les workers, textes dans l'ordre.
+        Chaque page est copiée une fois en mémoire partagée puis libérée dès son résultat reçu ;
+        une page en échec donne un texte vide."""
+        timeout = self.job_timeout if timeout is None else timeout
+        if self.max_workers == 0:
+            from .ocr import ocr_service
+            import numpy as np
+            for image in images:
+                yield ocr_service.degraded(level).ocr_array(np.asarray(image), lang)
+            return
+
+        def drain_one():
+            page, future = pending.pop(0)
+            result = self._collect(future, f"page {page.name}", timeout)
+            page.unlink()
+            if isinstance(result, OCRResult):
+                logging.warning(f"OCR page en échec : {result.error}")
+                ocr_metrics.incr("ocr.pages_failed")
+                return ""
+            text, delta = result
+            ocr_metrics.merge(delta)
+            return text
+
+        window = self.max_workers * 2
+        pending = []
+        with shared_pages() as share:
+            for image in images:
+                page = share(image)
+                pending.append((page, self._submit(_run_page, page, lang, level)))
+                if len(pending) >= window:
+                    yield drain_one()
+            while pending:
+                yield drain_one()
+
+    def map_pdf_text(self, file_bytes, ranges, timeout=None):
+        """Couche texte d'un PDF lue par tranches de pages [first, last) sur les workers ; une
+        liste de (texte, contient_des_images) par tranche, dans l'ordre. Le PDF est partagé une
+        seule fois. Fermer le générateur (arrêt anticipé) annule les tranches encore en attente.
+        Une tranche en échec est rendue comme des pages vides à images (candidates à l'OCR)."""
+        timeout = self.job_timeout if timeout is None else timeout
+        document = SharedPage.from_bytes(file_bytes)
+        pending = []
+        try:
+            window = max(1, self.max_workers) * 2
+            ranges = iter(ranges)
+            for first, last in ranges:
+                pending.append((first, last, self._submit(_run_pdf_text, document, first, last)))
+                if len(pending) >= window:
+                    break
+            while pending:
+                first, last, future = pending.pop(0)
+                result = self._collect(future, f"pages {first + 1}-{last}", timeout)
+                if isinstance(result, OCRResult):
+                    logging.warning(f"Couche texte en échec (pages {first + 1}-{last}) : {result.error}")
+                    chunk = [("", True)] * (last - first)
+                else:
+                    chunk, delta = result
+                    ocr_metrics.merge(delta)
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    pending.append((*next_range, self._submit(_run_pdf_text, document, *next_range)))
+                yield chunk
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+            document.unlink()
+
+    def _use_fanout(self, file_bytes, profile):
+        return self.page_fanout and self.max_workers > 0 and profile == "full" and file_bytes.startswith(b"%PDF")
+
+    def _run_fanout(self, file_bytes, filename, timeout=None):
+        """Routage du document dans ce processus (pypdf, rasterisation), OCR des pages sur le pool.
+        Le budget du document est plafonné au délai du job : passé ce délai, plus aucune page
+        n'est lancée (résultat partiel) et chaque page reste bornée par le délai de map_pages."""
+        from .ocr import ocr_service
+        engine = copy.copy(ocr_service)
+        engine.page_executor = self
+        engine.pdf_page_workers = max(engine.pdf_page_workers, self.max_workers)
+        budget = engine.new_budget()
+        if timeout:
+            budget.seconds = min(budget.seconds or timeout, timeout)
+        return engine.extract(file_bytes, filename=filename, budget=budget)
+
+    def _collect(self, future, filename, timeout):
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return self._timeout(future, filename, timeout)
+        except BrokenProcessPool as e:
+            retry = self._retry(future)
+            if retry is not None:
+                logging.info(f"OCR relancé après recyclage du pool : {filename}")
+                return self._collect(retry, filename, timeout)
+            self._reset_pool(getattr(future, "pool", None))
+            return OCRResult.failure("worker_crashed", f"Worker OCR interrompu : {str(e)}")
+        except Exception as e:
+            return OCRResult.failure("internal", f"Erreur Critique OCR : {str(e)}")
+
+    def _cache_lookup(self, file_bytes, profile="full"):
+        if self.cache is None:
+            return None, None
+        key = self.cache.make_key(file_bytes, variant=self._cache_variants[profile])
+        text = self.cache.get(key)
+        return key, (OCRResult(text, cached=True) if text is not None else None)
+
+    def _finish(self, key, result):
+        """Fusionne les métriques du worker, alimente le cache et retourne l'OCRResult."""
+        if not isinstance(result, OCRResult):
+            result, delta = result
+            ocr_metrics.merge(delta)
+        # Seuls les succès complets et pleine qualité sont mis en cache : une erreur transitoire
+        # ou un texte dégradé par le budget doit pouvoir être refait
+        if key is not None and result.ok and result.text and not result.degraded:
+            self.cache.put(key, result.text)
+        return result
+
+    def extract(self, file_bytes, filename="", timeout=None, profile="full"):
+        """Extraction bloquante via le pool. Retourne un OCRResult."""
+        timeout = self.job_timeout if timeout is None else timeout
+        key, cached = self._cache_lookup(file_bytes, profile)
+        if cached:
+            return cached
+        if self.max_workers == 0:
+            return self._finish(key, _run_extraction(file_bytes, filename, profile))
+        if self._use_fanout(file_bytes, profile):
+            return self._finish(key, self._run_fanout(file_bytes, filename, timeout))
+        return self._finish(key, self._collect(self.submit(file_bytes, filename, profile), filename, timeout))
+
+    async def extract_async(self, file_bytes, filename="", timeout=None, profile="full"):
+        """Variante pour les routes FastAPI : la boucle d'événements n'est jamais bloquée."""
+        timeout = self.job_timeout if timeout is None else timeout
+        key, cached = self._cache_lookup(file_bytes, profile)
+        if cached:
+            return cached
+        if self.max_workers == 0:
+            return self._finish(key, await asyncio.to_thread(_run_extraction, file_bytes, filename, profile))
+        if self._use_fanout(file_bytes, profile):
+            # Le budget plafonné arrête le routage ; wait_for borne en plus l'attente de la route
+            try:
+                return self._finish(key, await asyncio.wait_for(
+                    asyncio.to_thread(self._run_fanout, file_bytes, filename, timeout), timeout=timeout))
+            except asyncio.TimeoutError:
+                logging.warning(f"OCR timeout ({timeout}s) pour {filename} (pages réparties)")
+                return OCRResult.failure("timeout", f"Délai OCR dépassé ({timeout:.0f}s) : {filename}")
+        future = self.submit(file_bytes, filename, profile)
+        while True:
+            try:
+                return self._finish(key, await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout))
+            except asyncio.TimeoutError:
+                return self._timeout(future, filename, timeout)
+            except BrokenProcessPool as e:
+                retry = self._retry(future)
+                if retry is not None:
+                    logging.info(f"OCR relancé après recyclage du pool : {filename}")
+                    future = retry
+                    continue
+                self._reset_pool(getattr(future, "pool", None))
+                return OCRResult.failure("worker_crashed", f"Worker OCR interrompu : {str(e)}")
+            except Exception as e:
+                return OCRResult.failure("internal", f"Erreur Critique OCR : {str(e)}")
+
+    def map_extract(self, jobs, timeout=None):
+        """Extrait un lot de (file_bytes, filename) en parallèle, résultats dans l'ordre des jobs."""
+        timeout = self.job_timeout if timeout is None else timeout
+        if self.max_workers == 0:
+            for file_bytes, filename in jobs:
+                yield self.extract(file_bytes, filename, timeout=timeout)
+            return
+        # Fenêtre glissante : on ne garde en vol que quelques jobs par worker (mémoire bornée).
+        # Les hits de cache passent dans la même file pour préserver l'ordre des résultats.
+        window = self.max_workers * 2
+        pending = []
+
+        def drain_one():
+            key, future, cached, name = pending.pop(0)
+            if cached:
+                return cached
+            return self._finish(key, self._collect(future, name, timeout))
+
+        for file_bytes, filename in jobs:
+            key, cached = self._cache_lookup(file_bytes)
+            future = None if cached else self.submit(file_bytes, filename)
+            pending.append((key, future, cached, filename))
+            if len(pending) >= window:
+                yield drain_one()
+        while pending:
+            yield drain_one()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+ocr_executor = OCRExecutor()
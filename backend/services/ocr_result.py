@@ -0,0 +1,141 @@
+import time
+import threading
+
+# Échelle de dégradation, du plus fidèle au plus économe (chaque palier cumule les précédents)
+LADDER = ("full", "reduced_dpi", "no_denoise", "first_pages")
+
+
+class OCRResult:
+    """Résultat structuré d'une extraction (remplace les chaînes d'erreur préfixées « [V5] »).
+
+    - `error_code` : None en cas de succès, sinon 'timeout', 'worker_crashed', 'pdf_unreadable',
+      'unsupported', 'empty' ou 'internal'.
+    - `level` : palier de l'échelle de dégradation atteint (index dans LADDER).
+    - `partial` : des pages ont été abandonnées faute de temps.
+    - `early_stop` : lecture arrêtée volontairement dès qu'il y avait assez de texte pour classer
+      (mode « assez pour classer ») ; le texte complet reste à extraire pour le stockage.
+    - `decisions` : journal lisible des dégradations appliquées.
+    Pour la compatibilité, un résultat se déballe comme l'ancien couple (text, error).
+    """
+
+    def __init__(self, text="", error=None, error_code=None, level=0, partial=False,
+                 pages_done=0, pages_total=None, elapsed=0.0, decisions=None, cached=False, early_stop=False):
+        self.text = text
+        self.error = error
+        self.error_code = error_code
+        self.level = level
+        self.partial = partial
+        self.pages_done = pages_done
+        self.pages_total = pages_total
+        self.elapsed = elapsed
+        self.decisions = decisions or []
+        self.cached = cached
+        self.early_stop = early_stop
+
+    @classmethod
+    def failure(cls, error_code, error, **kwargs):
+        return cls(text="", error=error, error_code=error_code, **kwargs)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def ladder(self):
+        return LADDER[self.level]
+
+    @property
+    def degraded(self):
+        """Vrai si le texte n'est pas celui d'une extraction pleine qualité complète."""
+        return self.level > 0 or self.partial or self.early_stop
+
+    def __iter__(self):
+        return iter((self.text, self.error))
+
+    def summary(self):
+        """Métadonnées exposées par l'API (sans le texte)."""
+        return {
+            "ladder": self.ladder,
+            "partial": self.partial,
+            "early_stop": self.early_stop,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "elapsed": round(self.elapsed, 3),
+            "decisions": self.decisions,
+            "cached": self.cached,
+            "error_code": self.error_code,
+        }
+
+    def __repr__(self):
+        return (f"OCRResult(chars={len(self.text)}, error_code={self.error_code!r}, "
+                f"ladder={self.ladder!r}, partial={self.partial})")
+
+
+class DocumentBudget:
+    """Budget de temps d'un document et palier courant de l'échelle de dégradation.
+
+    Avant chaque lot de pages, `plan` projette le temps restant d'après la durée mesurée des
+    pages déjà traitées : si la projection dépasse le budget restant, on descend d'un palier
+    (jamais on ne remonte). Au dernier palier, seules les `first_pages` premières pages sont
+    traitées ; une fois le budget épuisé, les pages restantes sont abandonnées (résultat partiel).
+    `seconds` à None ou 0 : pas de budget.
+    """
+
+    # Gain supposé d'un palier tant qu'il n'a pas été mesuré
+    STEP_SPEEDUP = 0.5
+
+    def __init__(self, seconds=None, first_pages=3):
+        self.seconds = seconds or None
+        self.first_pages = first_pages
+        self.start = time.perf_counter()
+        self.level = 0
+        self.partial = False
+        self.pages_done = 0
+        self.decisions = []
+        self._page_seconds = []  # durées des pages au palier courant
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        if self.seconds is None:
+            return float("inf")
+        return self.seconds - self.elapsed()
+
+    def record(self, seconds, pages=1):
+        """Durée d'un lot de `pages` pages traité au palier courant."""
+        with self._lock:
+            self.pages_done += pages
+            self._page_seconds.extend([seconds / max(pages, 1)] * pages)
+
+    def _step(self, reason):
+        self.level += 1
+        self._page_seconds = []
+        self.decisions.append(f"{LADDER[self.level]} : {reason}")
+
+    def plan(self, pages_left=1, pages_started=0, parallel=1):
+        """Palier à utiliser pour le prochain lot, ou None s'il faut abandonner les pages restantes."""
+        with self._lock:
+            if self.seconds is None:
+                return self.level
+            remaining = self.remaining()
+            if remaining <= 0:
+                if not self.partial:
+                    self.decisions.append(f"arrêt : budget de {self.seconds:.0f}s épuisé "
+                                          f"après {pages_started} pages")
+                self.partial = True
+                return None
+
+            per_page = sum(self._page_seconds) / len(self._page_seconds) if self._page_seconds else 0.0
+            projected = per_page * pages_left / max(parallel, 1)
+            while projected > remaining and self.level < len(LADDER) - 1:
+                self._step(f"{projected:.1f}s projetées pour {pages_left} pages, {remaining:.1f}s restantes")
+                projected *= self.STEP_SPEEDUP
+
+            if self.level == len(LADDER) - 1 and pages_started >= self.first_pages:
+                if not self.partial:
+                    self.decisions.append(f"arrêt : {pages_started} premières pages seulement")
+                self.partial = True
+                return None
+            return self.level
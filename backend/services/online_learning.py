@@ -0,0 +1,296 @@
+import os
+import copy
+import time
+import queue
+import random
+import logging
+import threading
+from collections import deque
+from .metrics import Metrics
+from .text_normalizer import normalize_texts
+
+online_metrics = Metrics()
+
+
+class OnlineLearner:
+    """Apprentissage incrémental à partir des corrections de catégorie des utilisateurs.
+
+    - `submit` met la correction en file (non bloquant) ; un thread dédié les regroupe en
+      micro-lots (`batch_size` corrections ou `flush_seconds` d'attente), hors du chemin de la requête.
+    - Modèle : HashingVectorizer (sans état, aucun vocabulaire à réapprendre) + SGDClassifier
+      (log_loss, pour predict_proba), mis à jour par `partial_fit`. Il est amorcé sur le
+      dataset CSV, ou repris depuis le dernier point de contrôle du registre.
+    - Holdout : une partie du dataset et une correction sur `holdout_every`. Ces exemples
+      ne servent jamais à l'entraînement. La partie dataset est le split de test enregistré
+      avec le modèle hors ligne en service s'il existe, sinon une ligne sur 5. Un micro-lot
+      qui fait baisser la précision du holdout de plus de `tolerance` est rejeté, avec les
+      corrections qu'il mettait de côté.
+    - Promotion : le modèle est activé dans le registre et échangé à chaud dans le classifieur
+      seulement s'il fait au moins aussi bien (à `tolerance` près) que le modèle en service,
+      mesuré sur les seuls exemples du holdout que ce dernier n'a jamais vus à l'entraînement
+      (son split de test enregistré, et les corrections mises de côté).
+    - Point de contrôle dans le registre (version non activée) tous les `checkpoint_every`
+      micro-lots acceptés ; seuls les `keep_checkpoints` derniers sont conservés.
+    - ONLINE_LEARNING : 1 pour activer (désactivé par défaut).
+    """
+
+    def __init__(self, classifier=None, registry=None, enabled=None, batch_size=None, flush_seconds=None,
+                 holdout_every=None, tolerance=None, checkpoint_every=None, csv_path=None):
+        self._classifier = classifier
+        self._registry = registry
+        self.enabled = os.getenv("ONLINE_LEARNING", "0") == "1" if enabled is None else enabled
+        self.batch_size = int(os.getenv("ONLINE_BATCH_SIZE", "16") if batch_size is None else batch_size)
+        self.flush_seconds = float(os.getenv("ONLINE_FLUSH_SECONDS", "60") if flush_seconds is None else flush_seconds)
+        self.holdout_every = int(os.getenv("ONLINE_HOLDOUT_EVERY", "5") if holdout_every is None else holdout_every)
+        self.tolerance = float(os.getenv("ONLINE_TOLERANCE", "0.01") if tolerance is None else tolerance)
+        self.checkpoint_every = int(os.getenv("ONLINE_CHECKPOINT_EVERY", "10") if checkpoint_every is None else checkpoint_every)
+        self.keep_checkpoints = int(os.getenv("ONLINE_KEEP_CHECKPOINTS", "5"))
+        self.n_features = int(os.getenv("ONLINE_HASHING_FEATURES", str(2 ** 16)))
+        self.holdout_size = int(os.getenv("ONLINE_HOLDOUT_SIZE", "500"))
+        self.csv_path = csv_path or os.getenv("ONLINE_BOOTSTRAP_CSV", "backend/ml/dataset.csv")
+
+        self.model = None
+        self.classes = None
+        self.holdout = deque(maxlen=self.holdout_size)  # (texte normalisé, catégorie)
+        self.held_corrections = deque(maxlen=self.holdout_size)  # part du holdout issue des corrections
+        self._served_unseen = (None, None)  # (version en service, son split de test)
+        self._corrections = 0
+        self._accepted = 0
+        self._queue = queue.Queue(maxsize=int(os.getenv("ONLINE_QUEUE", "1000")))
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def classifier(self):
+        if self._classifier is None:
+            from .classifier import classifier_service
+            self._classifier = classifier_service
+        return self._classifier
+
+    @property
+    def registry(self):
+        return self._registry or self.classifier.registry
+
+    def submit(self, text, category):
+        """Enregistre une correction (non bloquant). Retourne True si elle sera apprise."""
+        if not self.enabled or not text or not category:
+            return False
+        try:
+            self._queue.put_nowait((text, category))
+        except queue.Full:
+            online_metrics.incr("online.dropped")
+            return False
+        online_metrics.incr("online.corrections")
+        self._ensure_thread()
+        return True
+
+    def flush(self):
+        """Attend que toutes les corrections en file soient traitées (tests, arrêt)."""
+        self._queue.join()
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="online-learner", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                with online_metrics.timer("online.update"):
+                    self.learn(batch)
+            except Exception as e:
+                logging.warning(f"Apprentissage incrémental impossible : {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    # --- Modèle ---
+
+    def _new_model(self, classes):
+        from sklearn.pipeline import Pipeline
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.classes = sorted(classes)
+        return Pipeline([
+            ('hashing', HashingVectorizer(
+                n_features=self.n_features,
+                stop_words=self.classifier.custom_stop_words,
+                ngram_range=(1, 2),
+                alternate_sign=False
+            )),
+            ('clf', SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42))
+        ])
+
+    def _partial_fit(self, model, texts, labels):
+        features = model.named_steps['hashing'].transform(texts)
+        model.named_steps['clf'].partial_fit(features, labels, classes=self.classes)
+
+    def _bootstrap(self):
+        """Reprend le dernier point de contrôle du registre, sinon amorce sur le dataset CSV."""
+        import pandas as pd
+
+        checkpoints = [meta for meta in self.registry.versions() if meta.get("online")]
+        if checkpoints:
+            meta = checkpoints[-1]
+            self.model = self.registry.load(meta["version"])
+            self.classes = list(self.model.classes_)
+            self.holdout.extend(self.registry.load_extra(meta["version"], "holdout", []))
+            self.held_corrections.extend(self.registry.load_extra(meta["version"], "held_corrections", []))
+            logging.info(f"Apprentissage incrémental : reprise du point de contrôle {meta['version']}")
+            return
+
+        texts, labels = [], []
+        if os.path.exists(self.csv_path):
+            df = pd.read_csv(self.csv_path)
+            texts = normalize_texts(df['texte'].astype(str).tolist())
+            labels = df['categorie'].astype(str).tolist()
+        self.model = self._new_model(set(labels) | set(self.classifier.fallback_categories))
+
+        rows = list(zip(texts, labels))
+        served = self._served_holdout()
+        if served:
+            # Même holdout que le modèle hors ligne en service : aucun des deux ne l'a vu
+            held = set(served)
+            self.holdout.extend(served)
+            train = [row for row in rows if row not in held]
+        else:
+            # Une ligne sur 5 du dataset réservée au holdout, le reste amorce le modèle
+            random.Random(42).shuffle(rows)
+            self.holdout.extend(rows[:len(rows) // 5])
+            train = rows[len(rows) // 5:]
+        if train:
+            for epoch in range(5):
+                random.Random(epoch).shuffle(train)
+                self._partial_fit(self.model, [t for t, _ in train], [l for _, l in train])
+        else:
+            # Aucun exemple : le modèle apprendra des seules corrections
+            self._partial_fit(self.model, [""], [self.classes[0]])
+        logging.info(f"Apprentissage incrémental : amorcé sur {len(train)} exemples, holdout de {len(self.holdout)}")
+
+    def _served_holdout(self):
+        """Split de test enregistré avec la version en service ([] si inconnu ou modèle en ligne)."""
+        version = self.classifier.model_version
+        if self._served_unseen[0] != version:
+            holdout = []
+            if version is not None:
+                try:
+                    if not self.registry.metadata(version).get("online"):
+                        holdout = [tuple(row) for row in self.registry.load_extra(version, "holdout", [])]
+                except (OSError, ValueError):
+                    pass
+            self._served_unseen = (version, holdout)
+        return self._served_unseen[1]
+
+    def _promotion_holdout(self):
+        """Exemples du holdout que le modèle en service n'a jamais vus à l'entraînement.
+        Un modèle issu de ce même apprentissage n'a vu aucun exemple du holdout ; un modèle hors
+        ligne n'a pas vu son split de test ; les corrections mises de côté ne sont vues par aucun."""
+        version = self.classifier.model_version
+        if version is not None:
+            try:
+                if self.registry.metadata(version).get("online"):
+                    return list(self.holdout)
+            except (OSError, ValueError):
+                pass
+        unseen = set(self._served_holdout()) | set(self.held_corrections)
+        return [row for row in self.holdout if row in unseen]
+
+    def _accuracy(self, model, holdout=None):
+        holdout = self.holdout if holdout is None else holdout
+        if model is None or not holdout:
+            return None
+        predictions = model.predict([t for t, _ in holdout])
+        return sum(p == l for p, (_, l) in zip(predictions, holdout)) / len(holdout)
+
+    def learn(self, corrections):
+        """Applique un micro-lot de corrections (texte brut, catégorie). Retourne True si accepté."""
+        if self.model is None:
+            self._bootstrap()
+
+        texts, labels, held_out = [], [], []
+        for text, label in zip(normalize_texts([t for t, _ in corrections]), (l for _, l in corrections)):
+            if label not in self.classes:
+                logging.warning(f"Apprentissage incrémental : catégorie inconnue ignorée ({label})")
+                online_metrics.incr("online.unknown_label")
+                continue
+            self._corrections += 1
+            if self.holdout_every and self._corrections % self.holdout_every == 0:
+                held_out.append((text, label))
+            else:
+                texts.append(text)
+                labels.append(label)
+        if not texts:
+            return False
+
+        # Mise à jour sur une copie : le modèle courant reste intact si le lot est rejeté
+        candidate = copy.deepcopy(self.model)
+        self._partial_fit(candidate, texts, labels)
+        before, after = self._accuracy(self.model), self._accuracy(candidate)
+        if before is not None and after < before - self.tolerance:
+            logging.warning(f"Apprentissage incrémental : lot rejeté (holdout {before:.2%} -> {after:.2%})")
+            online_metrics.incr("online.rejected")
+            return False
+
+        # Les exemples mis de côté ne rejoignent le holdout qu'avec un lot accepté
+        self.model = candidate
+        self.holdout.extend(held_out)
+        self.held_corrections.extend(held_out)
+        self._accepted += 1
+        online_metrics.incr("online.updates")
+        logging.info(f"Apprentissage incrémental : {len(texts)} corrections apprises")
+
+        # Promotion : comparaison au modèle en service, sur les exemples qu'il n'a jamais vus
+        if held_out:
+            after = self._accuracy(self.model)
+        if self.classifier.model is None:
+            promote = True
+        else:
+            unseen = self._promotion_holdout()
+            served, candidate_score = self._accuracy(self.classifier.model, unseen), self._accuracy(self.model, unseen)
+            # Sans exemple inédit pour le modèle en service, aucune comparaison honnête : pas de promotion
+            promote = served is not None and candidate_score >= served - self.tolerance
+            logging.info(f"Apprentissage incrémental : {len(unseen)} exemples inédits, "
+                         f"en service {served}, incrémental {candidate_score}")
+        if promote:
+            self._publish(after, activate=True)
+        elif self._accepted % self.checkpoint_every == 0:
+            self._publish(after, activate=False)
+        return True
+
+    def _publish(self, accuracy, activate):
+        """Point de contrôle dans le registre ; `activate` promeut aussi le modèle en service."""
+        version = self.registry.publish(self.model, {
+            "model": "SGD (online)",
+            "features": "hashing",
+            "online": True,
+            "score": None if accuracy is None else round(accuracy, 4),
+            "corrections": self._corrections,
+            "holdout_size": len(self.holdout),
+        }, activate=activate, extras={"holdout": list(self.holdout),
+                                      "held_corrections": list(self.held_corrections)})
+        online_metrics.incr("online.checkpoints")
+        if activate:
+            self.classifier.reload(version)
+            online_metrics.incr("online.promoted")
+        self._prune()
+        return version
+
+    def _prune(self):
+        """Supprime les anciens points de contrôle (jamais une version de l'historique d'activation)."""
+        history = set(self.registry.history())
+        checkpoints = [meta["version"] for meta in self.registry.versions()
+                       if meta.get("online") and meta["version"] not in history]
+        for version in checkpoints[:-self.keep_checkpoints]:
+            self.registry.remove(version)
+
+
+online_learner = OnlineLearner()
@@ -0,0 +1,101 @@
+import gc
+import logging
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedPage:
+    """Page rasterisée (np.uint8, niveaux de gris ou RGB) ou document brut placé en mémoire partagée.
+
+    Seul le descripteur (nom du segment, forme, dtype) est picklé vers le worker, qui
+    s'attache au segment et lit les pixels sans copie. Cycle de vie :
+    - le processus qui crée la page (`from_image`) en est propriétaire et doit appeler
+      `unlink` une fois le résultat reçu (ou le job abandonné) ;
+    - le worker n'utilise que `attach`, qui referme sa projection en sortie.
+    """
+
+    def __init__(self, name, shape, dtype="uint8"):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).str
+        self._shm = None  # segment possédé (côté créateur uniquement)
+
+    def __getstate__(self):
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype, "_shm": None}
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+    @classmethod
+    def from_image(cls, image):
+        """Copie une image PIL (L ou RGB) ou un tableau numpy dans un nouveau segment.
+        C'est la seule copie des pixels : le worker les lit ensuite en place."""
+        if not isinstance(image, np.ndarray):
+            if image.mode not in ("L", "RGB"):
+                image = image.convert("RGB")
+            image = np.asarray(image)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        page = cls(shm.name, image.shape, image.dtype)
+        page._shm = shm
+        np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+        return page
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Octets bruts (ex. un PDF) partagés une fois entre plusieurs workers."""
+        return cls.from_image(np.frombuffer(data, dtype=np.uint8))
+
+    @contextmanager
+    def attach(self):
+        """Vue numpy en lecture seule sur le segment, valable le temps du bloc `with`."""
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            view = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+            view.flags.writeable = False
+            yield view
+        finally:
+            view = None
+            _close(shm)
+
+    def unlink(self):
+        """Libère le segment (propriétaire uniquement ; sans effet si déjà libéré)."""
+        shm, self._shm = self._shm, None
+        if shm is None:
+            return
+        _close(shm)
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _close(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # Une image dérivée référence encore la vue : on la laisse au ramasse-miettes
+        gc.collect()
+        try:
+            shm.close()
+        except BufferError:
+            logging.warning(f"Segment partagé {shm.name} encore référencé, fermeture différée")
+
+
+@contextmanager
+def shared_pages():
+    """Pages créées dans le bloc, toutes libérées en sortie (y compris sur erreur ou délai dépassé)."""
+    pages = []
+
+    def share(image):
+        page = SharedPage.from_image(image)
+        pages.append(page)
+        return page
+
+    try:
+        yield share
+    finally:
+        for page in pages:
+            page.unlink()
@@ -0,0 +1,41 @@
+import re
+
+# Caractères conservés (après mise en minuscule) : lettres ASCII, chiffres, voyelles accentuées
+# et cédille du français, ligatures œ/æ et ÿ. Tout le reste, espaces compris, sépare les mots.
+KEPT_CHARS = "a-z0-9àâäéèêëîïôöùûüçœæÿ"
+
+# Toute suite de caractères non conservés devient une seule espace : remplace en une passe
+# l'ancien couple « caractère spécial -> espace » puis « espaces multiples -> une espace ».
+_SEPARATORS = re.compile(f"[^{KEPT_CHARS}]+")
+
+# Variante du lot : le séparateur de documents \x00 est conservé pour pouvoir redécouper
+_BULK_SEPARATOR = "\x00"
+_SEPARATORS_BULK = re.compile(f"[^{KEPT_CHARS}{_BULK_SEPARATOR}]+")
+
+
+def normalize_text(text):
+    """Texte prêt pour les mots-clés et le TF-IDF : minuscules, sans ponctuation ni caractères
+    spéciaux, mots séparés par une seule espace. Les \\n littéraux (échappés) comptent comme des espaces."""
+    if not text:
+        return ""
+    text = str(text).replace("\\n", " ").lower()
+    return _SEPARATORS.sub(" ", text).strip()
+
+
+def normalize_texts(texts):
+    """`normalize_text` sur une liste ou une Series pandas (même type en sortie, même index).
+
+    Les textes sont joints par \\x00 et normalisés en un seul passage du moteur d'expressions
+    régulières, puis redécoupés ; si un texte contient déjà \\x00, retour au texte par texte.
+    """
+    values = ["" if not text else str(text) for text in texts]
+    joined = _BULK_SEPARATOR.join(values)
+    if joined.count(_BULK_SEPARATOR) == len(values) - 1:
+        joined = _SEPARATORS_BULK.sub(" ", joined.replace("\\n", " ").lower())
+        result = [part.strip() for part in joined.split(_BULK_SEPARATOR)]
+    else:
+        result = [normalize_text(text) for text in values]
+
+    if hasattr(texts, "index") and hasattr(texts, "str"):
+        return type(texts)(result, index=texts.index)
+    return result
@@ -4,6 +4,8 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from backend.services.classifier import classifier_service
+from backend.services.keyword_matcher import KeywordMatcher
+from backend.services.text_normalizer import normalize_text, normalize_texts
 
 def test_logic():
     print("=== Test de Logique Classifieur ===")
@@ -47,5 +49,89 @@ def test_logic():
 
     print("\n✅ Tous les tests logiques sont passés.")
 
+def test_keyword_matcher():
+    print("=== Test Matcher de mots-clés ===")
+
+    def reference(categories, text):
+        # Ancien calcul : un text.count par mot-clé
+        scores = {cat: 0 for cat in categories}
+        for cat, keywords in categories.items():
+            for kw in keywords:
+                scores[cat] += text.count(kw.lower()) * (2 if len(kw) > 4 else 1)
+        return scores
+
+    # Préfixes communs, mot-clé à bord (chevauchement), mot-clé partagé entre catégories
+    categories = {"A": ["tva", "total", "total ttc", "aa"], "B": ["ticket", "total"], "C": []}
+    texts = ["total ttc total tva", "aaaa", "ticketicket ticket", "", "rien"]
+    matcher = KeywordMatcher(categories)
+    for text in texts:
+        assert matcher.scores(text) == reference(categories, text), text
+
+    categories = classifier_service.fallback_categories
+    text = classifier_service.clean_text("FACTURE N°12345 TOTAL TTC 100€ TVA 20% Contrat de travail, ordonnance")
+    assert classifier_service.keyword_matcher().scores(text) == reference(categories, text)
+    print("✅ Scores identiques à text.count")
+
+def classify_one_by_one(service, text):
+    """Copie de l'ancien `classify` (avant le lot) : un predict puis un predict_proba par texte."""
+    text_clean = service.clean_text(text)
+    scores = service.keyword_matcher().scores(text_clean)
+    best_cat_rules = max(scores, key=scores.get)
+    total_hits = sum(scores.values())
+    if total_hits >= 2:
+        confidence_rules = min(scores[best_cat_rules] / total_hits, 0.95)
+        if confidence_rules >= 0.5:
+            return best_cat_rules, confidence_rules
+    if service.model:
+        try:
+            prediction = service.model.predict([text_clean])[0]
+            try:
+                confidence = float(max(service.model.predict_proba([text_clean])[0]))
+            except Exception:
+                confidence = 0.85
+            if confidence > 0.80:
+                return prediction, confidence
+            if prediction == best_cat_rules and total_hits > 0:
+                return prediction, max(confidence, 0.70)
+        except Exception:
+            pass
+    if total_hits > 0:
+        return best_cat_rules, min(scores[best_cat_rules] / total_hits, 0.80)
+    return "AUTRE", 0.10
+
+def test_classify_many():
+    print("=== Test Classification par lot ===")
+    texts = [
+        "FACTURE N°12345 TOTAL TTC 100€ TVA 20% PAIEMENT PAR VIREMENT",
+        "Conversation with ChatGPT about python code... image generation...",
+        "",
+        "Description Price Quantity Total BILLED TO Due Date",
+        "CONTRAT DE TRAVAIL Fait à Paris le... Signature des parties...",
+    ]
+    csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ml", "dataset.csv")
+    if os.path.exists(csv_path):
+        import pandas as pd
+        texts += pd.read_csv(csv_path)['texte'].astype(str).tolist()
+    batch = classifier_service.classify_many(texts)
+    expected = [classify_one_by_one(classifier_service, text) for text in texts]
+    assert [c for c, _ in batch] == [c for c, _ in expected]
+    assert all(abs(a - b) < 1e-9 for (_, a), (_, b) in zip(batch, expected))
+    assert classifier_service.classify_many([]) == []
+    print(f"✅ Lot identique à l'ancien classify texte par texte ({len(texts)} textes)")
+
+def test_normalizer():
+    print("=== Test Normalisation du texte ===")
+    assert normalize_text("FACTURE N°12 :\\nTotal  TTC\n(Été)") == "facture n 12 total ttc été"
+    assert normalize_text(None) == "" and normalize_text("!!") == ""
+    # Ligatures conservées (auparavant remplacées par des espaces)
+    assert normalize_text("Œuvre, L'HAŸ") == "œuvre l haÿ"
+    texts = ["Contrat\x00signé", "", None, "  Reçu N°5 ", "a\\nb"]
+    assert normalize_texts(texts) == [normalize_text(t) for t in texts]
+    assert normalize_texts(texts[1:]) == [normalize_text(t) for t in texts[1:]]
+    print("✅ Normalisation texte par texte et par lot identiques")
+
 if __name__ == "__main__":
     test_logic()
+    test_keyword_matcher()
+    test_classify_many()
+    test_normalizer()
@@ -0,0 +1,45 @@
+import sys
+import os
+import json
+import tempfile
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.services.debug_artifacts import DebugArtifactWriter, safe_name
+
+def test_debug_artifacts_logic():
+    print("=== Test Artefacts de debug OCR ===")
+    assert safe_name("../../etc/passwd") == "passwd"
+    assert safe_name("scan facture (1).png") == "scan_facture_1_.png"
+    assert safe_name("") == "unknown"
+
+    scan = Image.fromarray((np.random.default_rng(0).random((3000, 2200)) * 255).astype(np.uint8))
+    with tempfile.TemporaryDirectory() as directory:
+        # Aucun échantillon : rien n'est écrit
+        writer = DebugArtifactWriter(directory, sample_rate=0)
+        assert not writer.submit(scan, "scan.png")
+
+        writer = DebugArtifactWriter(directory, sample_rate=1.0, max_bytes=800_000, max_side=800, queue_size=64)
+        for i in range(10):
+            assert writer.submit(scan, f"../scan {i}.png", {"ocr": {"method": "soft", "confidence": 12.5}})
+        writer.flush()
+
+        files = sorted(os.listdir(directory))
+        images = [f for f in files if f.endswith(".jpg")]
+        sidecars = [f for f in files if f.endswith(".json")]
+        total = sum(os.path.getsize(os.path.join(directory, f)) for f in files)
+        print(f"{len(images)} artefacts conservés, {total} octets")
+        assert len(images) == len(sidecars) and 0 < len(images) < 10, "La rotation doit borner le dossier"
+        assert total <= 800_000
+
+        with open(os.path.join(directory, sidecars[-1]), encoding="utf-8") as f:
+            info = json.load(f)
+        assert max(info["saved_size"]) == 800 and info["original_size"] == [2200, 3000]
+        assert info["ocr"]["method"] == "soft" and info["image"] in images
+        assert all(".." not in name and " " not in name for name in files)
+
+    print("\n✅ Échecs échantillonnés, réduits, nommés sans risque et plafonnés sur disque.")
+
+if __name__ == "__main__":
+    test_debug_artifacts_logic()
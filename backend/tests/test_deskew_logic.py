@@ -0,0 +1,36 @@
+import sys
+import os
+import random
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.services.image_analysis import detect_orientation
+
+def make_page():
+    random.seed(7)
+    words = "facture numero client montant hors taxes pour total paiement virement bancaire jours merci".split()
+    page = Image.new('L', (1700, 2200), 'white')
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=28)
+    for y in range(100, 2100, 45):
+        draw.text((80, y), " ".join(random.choice(words) for _ in range(6)).capitalize(), fill='black', font=font)
+    return page
+
+def test_deskew_logic():
+    print("=== Test Orientation / Inclinaison ===")
+    page = make_page()
+
+    for rotation in (0, 90, 180, 270):
+        for skew in (0, 4):
+            scanned = page.rotate(skew, expand=True, fillcolor=255).rotate(rotation, expand=True)
+            orientation, angle = detect_orientation(np.asarray(scanned))
+            print(f"Page tournée de {rotation}° + {skew}° -> correction {orientation}° puis {angle:.1f}°")
+            # Une page droite ne doit jamais être tournée (ancien bug : -90° systématique)
+            assert orientation == (360 - rotation) % 360, f"Orientation {orientation} au lieu de {(360 - rotation) % 360}"
+            assert abs(angle + skew) <= 0.5, f"Inclinaison {angle} au lieu de {-skew}"
+
+    print("\n✅ Orientation et inclinaison correctement détectées.")
+
+if __name__ == "__main__":
+    test_deskew_logic()
@@ -0,0 +1,157 @@
+import sys
+import os
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import numpy as np
+from sklearn.pipeline import Pipeline
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import RandomForestClassifier
+from backend.services.model_registry import ModelRegistry, dataset_hash
+from backend.services.classifier import MLDocumentClassifier
+from backend.services.linear_scorer import LinearScorer, export_linear
+from backend.services.model_tournament import train_candidates
+
+def tiny_model(labels):
+    texts = ["alpha beta", "alpha gamma", "delta epsilon", "delta zeta"]
+    return Pipeline([("tfidf", TfidfVectorizer()), ("clf", LogisticRegression())]).fit(texts, labels)
+
+def test_model_registry_logic():
+    print("=== Test Registre de modèles ===")
+    with tempfile.TemporaryDirectory() as registry_dir:
+        registry = ModelRegistry(registry_dir)
+        assert registry.current() is None and registry.versions() == []
+
+        # Cas 1: Publication versionnée avec métadonnées, activée de façon atomique
+        v1 = registry.publish(tiny_model(["A", "A", "B", "B"]), {"model": "LR", "score": 0.9,
+                                                                   "dataset_hash": dataset_hash(["x"], ["A"])})
+        assert registry.current() == v1
+        meta = registry.versions()[0]
+        assert meta["version"] == v1 and meta["score"] == 0.9 and "trained_at" in meta
+        assert not [name for name in os.listdir(registry_dir) if name.endswith(".tmp")]
+
+        # Cas 2: Un serveur démarré charge la version active
+        service = MLDocumentClassifier(model_path=os.path.join(registry_dir, "absent.joblib"), registry=registry)
+        assert service.model_version == v1
+        assert service.model.predict(["alpha"])[0] == "A"
+
+        # Cas 3: Réentraînement dans un autre processus -> rechargement à chaud pendant des classifications
+        v2 = registry.publish(tiny_model(["C", "C", "D", "D"]), {"model": "LR", "score": 0.95})
+        errors = []
+        def classify_loop():
+            try:
+                for _ in range(50):
+                    service.classify_many(["alpha omega", "delta"])
+            except Exception as e:
+                errors.append(e)
+        worker = threading.Thread(target=classify_loop)
+        worker.start()
+        assert service.check_for_update() == v2
+        worker.join()
+        assert not errors and service.model_version == v2
+        assert service.model.predict(["alpha"])[0] == "C"
+
+        # Cas 4: Retour arrière instantané (modèle précédent gardé en mémoire)
+        previous_model = service._previous[1]
+        assert service.rollback() == v1
+        assert service.model is previous_model and registry.current() == v1
+        print(f"Versions -> {[m['version'] for m in registry.versions()]}, active {service.model_version}")
+
+        # Cas 5: Plus de version précédente
+        try:
+            service.rollback()
+            assert False, "Devrait lever ValueError"
+        except ValueError:
+            pass
+
+    print("\n✅ Le registre publie, recharge à chaud et revient en arrière.")
+
+def test_linear_scorer_logic():
+    print("=== Test Scoreur linéaire compact ===")
+    texts = ["facture tva total", "facture montant ttc", "total à payer facture", "contrat de travail signé",
+             "contrat bail signature", "signature des parties contrat", "ordonnance médecin", "médecin patient ordonnance",
+             "patient santé ordonnance"]
+    labels = ["FACTURE"] * 3 + ["CONTRAT"] * 3 + ["MEDICAL"] * 3
+    queries = texts + ["", "inconnu", "facture contrat", "ordonnance ordonnance facture"]
+    with tempfile.TemporaryDirectory() as registry_dir:
+        registry = ModelRegistry(registry_dir)
+        candidates = {
+            "LogisticRegression": LogisticRegression(),
+            "SVM (Linear)": CalibratedClassifierCV(SGDClassifier(random_state=0), cv=3),
+        }
+        for name, clf in candidates.items():
+            pipeline = Pipeline([("tfidf", TfidfVectorizer(ngram_range=(1, 2), stop_words=["de", "des"])),
+                                 ("clf", clf)]).fit(texts, labels)
+            version = registry.publish(pipeline, {"model": name}, export=export_linear)
+
+            # Cas 1: La version est servie par le scoreur NumPy, mêmes probabilités que sklearn
+            scorer = registry.load(version)
+            assert isinstance(scorer, LinearScorer) and registry.metadata(version)["scorer"] == "linear"
+            assert list(scorer.classes_) == list(pipeline.classes_)
+            assert np.allclose(scorer.predict_proba(queries), pipeline.predict_proba(queries), atol=1e-12)
+            assert list(scorer.predict(queries)) == list(pipeline.predict(queries))
+            print(f"{name} -> scoreur linéaire identique au Pipeline")
+
+        # Cas 2: RandomForest n'est pas exportable -> Pipeline sklearn
+        forest = Pipeline([("tfidf", TfidfVectorizer()), ("clf", RandomForestClassifier(n_estimators=5))]).fit(texts, labels)
+        version = registry.publish(forest, {"model": "RandomForest"}, export=export_linear)
+        assert registry.metadata(version)["scorer"] == "sklearn"
+        assert isinstance(registry.load(version), Pipeline)
+
+    print("\n✅ Export compact fidèle, repli sklearn pour les modèles non linéaires.")
+
+def test_train_candidates_logic():
+    print("=== Test Tournoi : estimateurs de l'appelant intacts ===")
+    texts = ["facture tva total", "facture montant ttc", "contrat de travail signé", "contrat bail signature"]
+    labels = ["FACTURE", "FACTURE", "CONTRAT", "CONTRAT"]
+    features = TfidfVectorizer().fit_transform(texts)
+    for n_jobs in (1, 2):
+        models = {"LogisticRegression": LogisticRegression(), "RandomForest": RandomForestClassifier(n_estimators=5, random_state=0)}
+        results = train_candidates(models, features, labels, features, labels, n_jobs=n_jobs)
+        # Séquentiel ou parallèle : des modèles entraînés distincts, ceux reçus jamais entraînés
+        assert [name for name, *_ in results] == list(models)
+        for (name, fitted, score, _), original in zip(results, models.values()):
+            assert fitted is not original and not hasattr(original, "classes_") and score == 1.0
+    print("\n✅ Le tournoi retourne des copies entraînées, en séquentiel comme en parallèle.")
+
+def test_hashing_features_logic():
+    print("=== Test Mode de features par hachage ===")
+    texts = [f"{word} document numéro {i}" for i in range(8)
+             for word in ("facture tva montant", "contrat signature parties", "ordonnance médecin patient")]
+    labels = ["FACTURE", "CONTRAT", "MEDICAL"] * 8
+    with tempfile.TemporaryDirectory() as registry_dir:
+        registry = ModelRegistry(registry_dir)
+        service = MLDocumentClassifier(model_path=os.path.join(registry_dir, "absent.joblib"), registry=registry)
+        service.hashing_features = 2 ** 10
+        assert service._train_from_data(texts, labels, features="hashing")
+
+        # Pipeline sans vocabulaire appris, servi par sklearn (pas d'export linéaire)
+        meta = registry.versions()[-1]
+        assert meta["features"] == "hashing" and meta["scorer"] == "sklearn"
+        model = registry.load(meta["version"])
+        assert [name for name, _ in model.steps] == ["hashing", "tfidf", "clf"]
+        assert model.predict(["facture tva"])[0] == "FACTURE"
+        assert not service._train_from_data(texts, labels, features="inconnu")
+
+        # Les deux modes, tournoi séquentiel (TRAIN_JOBS=1, ou machine à un cœur) : le vainqueur
+        # publié doit rester cohérent avec ses propres features (ancien bug : réajusté en hachage)
+        os.environ["TRAIN_JOBS"] = "1"
+        try:
+            assert service._train_from_data(texts, labels, features="both")
+        finally:
+            del os.environ["TRAIN_JOBS"]
+        meta = registry.versions()[-1]
+        model = registry.load(meta["version"])
+        assert meta["system_score"] == 1.0, meta
+        assert list(model.predict(texts)) == labels
+
+    print("\n✅ Le mode hachage s'entraîne et se publie dans le registre.")
+
+if __name__ == "__main__":
+    test_model_registry_logic()
+    test_linear_scorer_logic()
+    test_train_candidates_logic()
+    test_hashing_features_logic()
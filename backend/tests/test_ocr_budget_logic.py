@@ -0,0 +1,99 @@
+import sys
+import os
+import time
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.services.ocr import OCREngine
+from backend.services.ocr_result import OCRResult, DocumentBudget
+from backend.services.ocr_executor import OCRExecutor
+from backend.services.metrics import ocr_metrics
+
+def fake_window(self, pdf_path, first, last, language, budget=None):
+    """Rasterisation + OCR simulés : le coût dépend de la résolution du palier."""
+    start = time.perf_counter()
+    time.sleep(0.04 * (last - first + 1) * self.pdf_dpi / 300)
+    if budget is not None:
+        budget.record(time.perf_counter() - start, pages=last - first + 1)
+    return [f"page {page} {self.pdf_dpi}dpi" for page in range(first, last + 1)]
+
+def test_ocr_budget_logic():
+    print("=== Test Budget OCR / Echelle de dégradation ===")
+    original = OCREngine._ocr_pdf_window
+    OCREngine._ocr_pdf_window = fake_window
+    try:
+        engine = OCREngine()
+        engine.pdf_page_workers = 2
+
+        # Sans budget : toutes les pages, pleine résolution
+        texts = engine.ocr_pdf_pages(b"%PDF", pages=range(1, 21))
+        assert len(texts) == 20 and all("300dpi" in t for t in texts)
+
+        # Budget juste : la résolution baisse en cours de route, mais toutes les pages sont lues
+        budget = DocumentBudget(0.35, first_pages=3)
+        texts = engine.ocr_pdf_pages(b"%PDF", pages=range(1, 21), budget=budget)
+        print(f"{len(texts)} pages, palier {budget.level}, décisions : {budget.decisions}")
+        assert budget.level > 0 and budget.decisions
+        assert texts[0].endswith("300dpi") and texts[-1].endswith(f"{engine.ladder_pdf_dpi}dpi")
+
+        # Budget intenable : on descend toute l'échelle et les dernières pages sont abandonnées
+        budget = DocumentBudget(0.1, first_pages=3)
+        texts = engine.ocr_pdf_pages(b"%PDF", pages=range(1, 21), budget=budget)
+        print(f"{len(texts)} pages, palier {budget.level}, décisions : {budget.decisions}")
+        assert budget.partial and len(texts) < 20
+        assert budget.elapsed() < 0.1 + 0.15, "Le budget doit borner la durée du document"
+    finally:
+        OCREngine._ocr_pdf_window = original
+
+    # Résultat structuré : plus de chaîne « [V5] », mais le déballage (text, error) reste possible
+    failure = OCRResult.failure("timeout", "Délai OCR dépassé")
+    text, error = failure
+    assert not failure.ok and text == "" and error == "Délai OCR dépassé"
+    assert OCRResult("texte", level=2).degraded and OCRResult("texte").summary()["ladder"] == "full"
+
+    print("\n✅ Le budget dégrade l'OCR puis coupe proprement les dernières pages.")
+
+def test_stuck_job_recycles_pool():
+    print("=== Test Job OCR bloqué : recyclage du pool ===")
+    executor = OCRExecutor(max_workers=1)
+    executor.cache = None  # résultats factices : rien dans le cache disque partagé
+    try:
+        # Un job démarré ne s'annule pas : au délai dépassé, son worker doit être terminé
+        stuck = executor._submit(time.sleep, 60)
+        innocent = executor._submit(abs, -3)  # en attente derrière le job bloqué
+        workers = []
+        while not workers:
+            workers = list(stuck.pool._processes.values())
+            time.sleep(0.05)
+        result = executor._collect(stuck, "bloque.pdf", timeout=2)
+        assert not result.ok and result.error_code == "timeout"
+        for worker in workers:
+            worker.join(timeout=10)
+            assert not worker.is_alive(), "Le worker bloqué doit être terminé"
+
+        # Le job interrompu par le recyclage est relancé sur le pool neuf, sans erreur
+        assert executor._collect(innocent, "innocent.pdf", timeout=60) == 3
+
+        # Le slot est libéré : le job suivant passe sur un pool neuf
+        job = executor._submit(abs, -3)
+        assert job.pool is not stuck.pool and executor._collect(job, "suivant.pdf", timeout=60) == 3
+
+        # Même chose côté API : une requête concurrente n'échoue pas à cause du fichier bloqué
+        async def concurrent_upload():
+            stuck = executor._submit(time.sleep, 60)
+            executor.submit = lambda *args: executor._submit(OCRResult, "texte innocent")
+            upload = asyncio.create_task(executor.extract_async(b"innocent-" + os.urandom(8), "innocent.png"))
+            await asyncio.sleep(0.5)
+            await asyncio.to_thread(executor._collect, stuck, "bloque.pdf", 1)
+            return await upload
+        result = asyncio.run(concurrent_upload())
+        assert result.ok and result.text == "texte innocent", result.error
+        assert ocr_metrics.snapshot()["counters"]["ocr.pool_recycled.retried"] == 2
+    finally:
+        executor.shutdown()
+
+    print("\n✅ Un job qui dépasse son délai libère son slot ; les autres jobs du pool sont relancés.")
+
+if __name__ == "__main__":
+    test_ocr_budget_logic()
+    test_stuck_job_recycles_pool()
@@ -0,0 +1,58 @@
+import sys
+import os
+import time
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.services.ocr_cache import OCRCache
+
+def test_ocr_cache_logic():
+    print("=== Test Cache OCR ===")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = OCRCache("v1", cache_dir=cache_dir, memory_items=2, disk_max_bytes=1000)
+        key = cache.make_key(b"%PDF facture")
+
+        # Cas 1: Miss puis hit mémoire
+        assert cache.get(key) is None
+        cache.put(key, "FACTURE N°1")
+        assert cache.get(key) == "FACTURE N°1"
+        assert cache.counters["memory_hits"] == 1 and cache.counters["misses"] == 1
+
+        # Cas 2: Persistance disque (nouvelle instance = redémarrage du serveur)
+        cache = OCRCache("v1", cache_dir=cache_dir, memory_items=2, disk_max_bytes=1000)
+        assert cache.get(key) == "FACTURE N°1"
+        assert cache.counters["disk_hits"] == 1
+
+        # Cas 3: Changement de réglages -> clé différente ; la version v1, encore utilisée (autre
+        # processus aux réglages différents), est conservée
+        cache_v2 = OCRCache("v2", cache_dir=cache_dir, memory_items=2, disk_max_bytes=1000)
+        assert cache_v2.make_key(b"%PDF facture") != key
+        assert cache_v2.get(cache_v2.make_key(b"%PDF facture")) is None
+        assert OCRCache("v1", cache_dir=cache_dir).get(key) == "FACTURE N°1"
+
+        # Cas 3 bis: Version inutilisée depuis plus de stale_seconds -> purgée au démarrage
+        old = time.time() - 3600
+        v1_dir = os.path.join(cache_dir, "v1")
+        for name in os.listdir(v1_dir):
+            os.utime(os.path.join(v1_dir, name), (old, old))
+        os.utime(v1_dir, (old, old))
+        OCRCache("v2", cache_dir=cache_dir, stale_seconds=7200)
+        assert os.path.exists(v1_dir)
+        OCRCache("v2", cache_dir=cache_dir, stale_seconds=60, purge_stale=False)
+        assert os.path.exists(v1_dir)
+        OCRCache("v2", cache_dir=cache_dir, stale_seconds=60)
+        assert not os.path.exists(v1_dir)
+
+        # Cas 4: Plafond disque -> éviction LRU
+        for i in range(5):
+            cache_v2.put(cache_v2.make_key(bytes([i])), "x" * 300)
+        stats = cache_v2.stats()
+        print(f"Stats -> {stats}")
+        assert stats["disk_bytes"] <= 1000
+        assert stats["evictions"] == 2
+        assert stats["memory_entries"] == 2
+
+    print("\n✅ Le cache OCR respecte LRU, persistance et invalidation.")
+
+if __name__ == "__main__":
+    test_ocr_cache_logic()
@@ -0,0 +1,89 @@
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.services.model_registry import ModelRegistry
+from backend.services.classifier import MLDocumentClassifier
+from backend.services.online_learning import OnlineLearner, online_metrics
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ml", "dataset.csv")
+
+def test_online_learning_logic():
+    print("=== Test Apprentissage incrémental ===")
+    with tempfile.TemporaryDirectory() as registry_dir:
+        registry = ModelRegistry(registry_dir)
+        service = MLDocumentClassifier(model_path=os.path.join(registry_dir, "absent.joblib"), registry=registry)
+        learner = OnlineLearner(classifier=service, enabled=True, batch_size=4, flush_seconds=0.2,
+                                holdout_every=5, checkpoint_every=1, csv_path=CSV_PATH)
+
+        # Cas 1: Corrections en file, apprises en micro-lots par le thread ; aucun modèle en
+        # service -> promotion immédiate et échange à chaud dans le classifieur
+        for i in range(8):
+            assert learner.submit(f"bordereau zorglub numéro {i}", "FACTURE")
+        learner.flush()
+        assert learner.holdout and registry.current() == service.model_version
+        assert registry.metadata(service.model_version)["online"]
+        assert service.model.predict(["bordereau zorglub"])[0] == "FACTURE"
+        print(f"Promu -> {service.model_version}, holdout {len(learner.holdout)}")
+
+        # Cas 2: Lot qui dégrade le holdout -> rejeté, modèle inchangé
+        model = learner.model
+        poison = [(text, "RECU" if label != "RECU" else "FACTURE") for text, label in list(learner.holdout)[:40]] * 3
+        assert not learner.learn(poison)
+        assert learner.model is model
+        assert online_metrics.snapshot()["counters"]["online.rejected"] >= 1
+
+        # Cas 3: Catégorie inconnue ignorée
+        assert not learner.learn([("texte quelconque", "INCONNUE")])
+
+        # Cas 4: Redémarrage -> reprise du dernier point de contrôle et de son holdout
+        resumed = OnlineLearner(classifier=service, enabled=True, csv_path=CSV_PATH)
+        resumed._bootstrap()
+        assert resumed.model.predict(["bordereau zorglub"])[0] == "FACTURE"
+        assert len(resumed.holdout) == len(learner.holdout)
+
+        # Cas 5: Désactivé -> rien n'est mis en file
+        assert not OnlineLearner(classifier=service, enabled=False).submit("texte", "FACTURE")
+
+    print("\n✅ Les corrections sont apprises, vérifiées sur holdout et promues à chaud.")
+
+def test_online_learning_with_served_model():
+    print("=== Test Apprentissage incrémental face à un modèle hors ligne en service ===")
+    with tempfile.TemporaryDirectory() as registry_dir:
+        registry = ModelRegistry(registry_dir)
+        service = MLDocumentClassifier(model_path=os.path.join(registry_dir, "absent.joblib"), registry=registry)
+        assert service.train_from_csv(CSV_PATH)
+        offline = service.model_version
+        test_split = [tuple(row) for row in registry.load_extra(offline, "holdout")]
+        assert test_split
+
+        # Cas 1: Holdout = split de test du modèle en service, jamais vu par l'un ou l'autre
+        strict = OnlineLearner(classifier=service, enabled=True, holdout_every=5, checkpoint_every=1,
+                               tolerance=0.0, csv_path=CSV_PATH)
+        strict._bootstrap()
+        assert set(strict.holdout) == set(test_split)
+        assert set(strict._promotion_holdout()) <= set(test_split)
+
+        # Cas 2: Comparaison honnête : promotion seulement si l'incrémental fait au moins aussi bien
+        corrections = [(f"bordereau zorglub numéro {i}", "FACTURE") for i in range(10)]
+        assert strict.learn(corrections)
+        unseen = strict._promotion_holdout()
+        assert len(unseen) == len(test_split) + len(strict.held_corrections)
+        served, online = strict._accuracy(service.model, unseen), strict._accuracy(strict.model, unseen)
+        print(f"Inédits : {len(unseen)}, en service {served:.2%}, incrémental {online:.2%}")
+        assert (service.model_version != offline) == (online >= served)
+
+        # Cas 3: Avec une tolérance suffisante, le modèle incrémental remplace le modèle hors ligne
+        service.reload(offline)
+        tolerant = OnlineLearner(classifier=service, enabled=True, holdout_every=5, checkpoint_every=1,
+                                 tolerance=0.5, csv_path=CSV_PATH)
+        assert tolerant.learn(corrections)
+        assert service.model_version != offline and registry.metadata(service.model_version)["online"]
+        assert service.model.predict(["bordereau zorglub"])[0] == "FACTURE"
+
+    print("\n✅ La promotion compare les modèles sur des exemples qu'aucun n'a appris.")
+
+if __name__ == "__main__":
+    test_online_learning_logic()
+    test_online_learning_with_served_model()
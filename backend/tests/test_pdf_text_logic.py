@@ -0,0 +1,111 @@
+import sys
+import os
+import io
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.services.ocr import OCREngine
+from backend.services.ocr_executor import OCRExecutor
+
+def make_pdf(page_count):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    for page in range(1, page_count + 1):
+        for line in range(30):
+            pdf.drawString(60, 780 - line * 22, f"Page {page} ligne {line} : contrat de travail, salaire et conditions")
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+def test_pdf_text_logic():
+    print("=== Test Couche texte PDF : parallélisme et arrêt anticipé ===")
+    pdf = make_pdf(12)
+    engine = OCREngine()
+
+    pages, total = engine.extract_pdf_text_pages(pdf)
+    assert total == 12 and len(pages) == 12
+    full = engine.extract(pdf, "contrat.pdf")
+    assert full.ok and not full.early_stop and "Page 12" in full.text
+
+    # Mode « assez pour classer » : on s'arrête dès que le texte suffit
+    fast = engine.fast_variant()
+    fast.text_enough_chars, fast.text_enough_pages = 3000, 5
+    preview = fast.extract(pdf, "contrat.pdf")
+    print(f"Aperçu : {len(preview.text)} caractères, {preview.pages_done}/{preview.pages_total} pages")
+    assert preview.ok and preview.early_stop and preview.degraded
+    assert preview.pages_done < 12 and full.text.startswith(preview.text)
+
+    # Tranches de pages lues par les workers : même résultat que la lecture séquentielle
+    executor = OCRExecutor(max_workers=2)
+    try:
+        parallel = OCREngine()
+        parallel.page_executor = executor
+        parallel.pdf_text_parallel_min_pages, parallel.pdf_text_chunk_pages = 4, 3
+        assert parallel.extract_pdf_text_pages(pdf) == (pages, total)
+    finally:
+        executor.shutdown()
+
+    print("\n✅ Couche texte lue par tranches en parallèle, arrêt anticipé sur le début du document.")
+
+def fake_window(self, pdf_path, first, last, language, budget=None):
+    return [f"Page {page} : facture scannée" for page in range(first, last + 1)]
+
+def test_unreadable_pdf_fallback():
+    print("=== Test PDF illisible par pypdf : OCR complet ===")
+    import pdf2image
+    original_info, original_window = pdf2image.pdfinfo_from_bytes, OCREngine._ocr_pdf_window
+    pdf2image.pdfinfo_from_bytes = lambda data, *args, **kwargs: {"Pages": 3}
+    OCREngine._ocr_pdf_window = fake_window
+    try:
+        damaged = b"%PDF-1.4\n" + b"\x00" * 64
+        full = OCREngine().extract(damaged, "scan.pdf")
+        assert full.ok and full.pages_done == 3 and full.pages_total == 3 and not full.early_stop
+
+        # Profil rapide (1re page) : le résultat doit se déclarer partiel, pas complet
+        preview = OCREngine().fast_variant().extract(damaged, "scan.pdf")
+        print(f"Aperçu : {preview.pages_done}/{preview.pages_total} pages, early_stop={preview.early_stop}")
+        assert preview.ok and preview.pages_done == 1 and preview.pages_total == 3
+        assert preview.early_stop and preview.degraded
+    finally:
+        pdf2image.pdfinfo_from_bytes, OCREngine._ocr_pdf_window = original_info, original_window
+
+    print("\n✅ L'OCR de repli déclare les pages lues et le nombre total de pages.")
+
+def make_inline_image_pdf():
+    """PDF scanné dont la page est une image en ligne (BI…ID…EI) : aucun XObject déclaré."""
+    from PIL import Image, ImageDraw
+    scan = Image.new('L', (600, 200), 'white')
+    ImageDraw.Draw(scan).text((20, 80), "FACTURE 42 TOTAL TTC", fill='black')
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.drawInlineImage(scan, 50, 500, width=300, height=100)
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+def test_inline_image_pdf():
+    print("=== Test PDF scanné en image en ligne : OCR de la page ===")
+    engine = OCREngine()
+    pages, total = engine.extract_pdf_text_pages(make_inline_image_pdf())
+    assert total == 1 and pages[0][0].strip() == ""
+
+    requested = []
+    def fake_ocr(file_bytes, pages=None, lang=None, budget=None):
+        requested.extend(pages)
+        return ["FACTURE 42 TOTAL TTC" for _ in pages]
+    engine.ocr_pdf_pages = fake_ocr
+    result = engine.extract(make_inline_image_pdf(), "scan.pdf")
+    assert requested == [1], "Une page sans couche texte doit être OCRisée, même sans XObject image"
+    assert result.ok and "FACTURE 42" in result.text
+
+    # Page texte sans image : couche native gardée, aucun OCR
+    requested.clear()
+    assert engine.extract(make_pdf(1), "contrat.pdf").ok and requested == []
+
+    print("\n✅ Les pages sans couche texte passent à l'OCR, les pages texte gardent leur texte natif.")
+
+if __name__ == "__main__":
+    test_pdf_text_logic()
+    test_unreadable_pdf_fallback()
+    test_inline_image_pdf()
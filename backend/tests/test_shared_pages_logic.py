@@ -0,0 +1,40 @@
+import sys
+import os
+import numpy as np
+from multiprocessing import shared_memory
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from backend.services.shared_pages import SharedPage, shared_pages
+from backend.services.ocr import OCREngine
+
+def test_shared_pages_logic():
+    print("=== Test Pages en mémoire partagée ===")
+    rng = np.random.default_rng(3)
+    page = Image.fromarray((rng.random((600, 450)) * 255).astype(np.uint8))
+    engine = OCREngine()
+
+    with shared_pages() as share:
+        shared = share(page)
+        print(f"Segment {shared.name} : {shared.shape} {shared.dtype} ({shared.nbytes} octets)")
+        # Seul le descripteur voyage : un worker s'y attache par son nom
+        with SharedPage(shared.name, shared.shape, shared.dtype).attach() as pixels:
+            assert not pixels.flags.writeable
+            assert np.array_equal(pixels, np.asarray(page))
+            # Le prétraitement lit la vue directement et donne le même résultat que depuis PIL
+            for method in ('soft', 'hard'):
+                assert np.array_equal(np.asarray(engine.enhance_image(pixels, method)),
+                                      np.asarray(engine.enhance_image(page, method)))
+            del pixels
+
+    # Segment libéré en sortie du bloc
+    try:
+        shared_memory.SharedMemory(name=shared.name).close()
+        assert False, "Le segment aurait dû être supprimé"
+    except FileNotFoundError:
+        pass
+
+    print("\n✅ Pages transmises par descripteur, sans copie, et segments libérés.")
+
+if __name__ == "__main__":
+    test_shared_pages_logic()